@@ -20,6 +20,12 @@ from theme    import *
 from layout   import *
 from controls import *
 from buttons  import *
+from visa     import CoalescingWriter, QueryBatch, Query
+
+####################################################
+
+# minimum interval between two writes of the wheel controls (seconds)
+_WRITE_INTERVAL = 0.05
 
 ####################################################
 
@@ -64,12 +70,25 @@ class _panel(Control):
     def _update(sefl, event):
         pass
 
+    # Instrument is an InstrumentWorker (see visa.py).
+    # The controls settings are read in a single batch of queries.
     def SetVisa(self, Instrument):
         self.instr = Instrument
-        self.CTRLS['FREQUENCY'].SetVisa(Instrument)
-        self.CTRLS['AMPLITUDE'].SetVisa(Instrument)
-        self.CTRLS['OUTPUT'].SetVisa(Instrument)
-        self.CTRLS['IMPEDANCE'].SetVisa(Instrument)
+        batch = QueryBatch(Instrument, ';:')
+        self.CTRLS['FREQUENCY'].SetVisa(Instrument, batch)
+        self.CTRLS['AMPLITUDE'].SetVisa(Instrument, batch)
+        self.CTRLS['OUTPUT'].SetVisa(Instrument, batch)
+        self.CTRLS['IMPEDANCE'].SetVisa(Instrument, batch)
+        batch.Run()
+        return
+
+    # minimum interval between two frequency or amplitude writes
+    def SetWriteInterval(self, Interval):
+        for name in ['FREQUENCY', 'AMPLITUDE']:
+            CTRL = self.CTRLS[name]
+            # kept for the writer created by SetVisa()
+            CTRL.interval = Interval
+            if CTRL.writer: CTRL.writer.SetInterval(Interval)
         return
 
 ####################################################
@@ -114,19 +133,22 @@ class _impedance(Control):
     def _update(self, event):
         self.status += 1
         self.status %= 2
+        # send the pending amplitude first
+        self.parent.CTRLS['AMPLITUDE']._flush()
         self._write()
-        # update limits and displays
-        self.parent.CTRLS['AMPLITUDE']._getLimit()
-        self.parent.CTRLS['AMPLITUDE']._read()
-        self.parent.CTRLS['AMPLITUDE']._refresh()
+        # update limits and displays (when the replies arrive)
+        self.parent.CTRLS['AMPLITUDE']._reread()
         # done
         self.SendEvent()
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        X = self.instr.query('OUTPUT:LOAD?')
+        Query(Instrument, 'OUTPUT:LOAD?', self._onLoad, Batch)
+        return
+
+    def _onLoad(self, X):
         # coerce to 50 or High impedance
         self.status = 0
         if int("%.0f" % float(X)) != 50: # use round()?
@@ -158,9 +180,13 @@ class _ouput(Control):
         self.SetSize(Content.GetSize())
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        x = int(self.instr.query("OUTPUT?"))
+        Query(Instrument, 'OUTPUT?', self._onOutput, Batch)
+        return
+
+    def _onOutput(self, X):
+        x = int(X)
         self.BTNSW.SetValue(x)
         self.SetValue(x)
         return
@@ -197,6 +223,8 @@ class _amplitude(Control):
         self.MinVal, self.Maxval = -inf, +inf
         self.status = 0.0, 0
         self.instr = None
+        self.writer = None
+        self.interval = _WRITE_INTERVAL
         # build control
         b = 0
         self.wheels = []        
@@ -240,23 +268,20 @@ class _amplitude(Control):
         self.unit.SetValue(u)
         return
 
-    # read digits
-    def _read(self):
+    def _onVolt(self, S):
         x, u = self.status
-        if self.instr:
-            S = self.instr.query('VOLT?')
-            x = float(S)
-            x = max(x, self.MinVal)
-            x = min(x, self.Maxval)
-            self.status = x, u
+        x = float(S)
+        x = max(x, self.MinVal)
+        x = min(x, self.Maxval)
+        self.status = x, u
         return
 
     # write digits
     def _write(self):
         x, u = self.status
         V = self.format % x
-        if self.instr:
-            self.instr.write('VOLT '+V)
+        if self.writer:
+            self.writer.Write('VOLT '+V)
         return
 
     # update digits or unit
@@ -266,10 +291,12 @@ class _amplitude(Control):
         # select digit or unit
         if event.caller == self.unit:
             u = event.caller.GetValue()
+            # send the pending amplitude first
+            self._flush()
             self.instr.write('VOLT:UNIT '+['VRMS','VPP'][u])
             self.status = x, u
-            self._getLimit()
-            self._read()
+            # update limits and displays (when the replies arrive)
+            self._reread()
         else:
             wheeln = self.wheels.index(event.caller)
             weight = 10**(self.n-wheeln-1)
@@ -283,23 +310,48 @@ class _amplitude(Control):
         self._refresh()
         return
 
-    def _getLimit(self):
+    # send the pending amplitude (no instrument: no writer)
+    def _flush(self):
+        if self.writer: self.writer.Flush()
+        return
+
+    # read the limits and the value again (no waiting)
+    def _reread(self):
         if self.instr:
-            MIN = self.instr.query('VOLT? MIN')
-            MAX = self.instr.query('VOLT? MAX')
-            self.MinVal, self.Maxval = float(MIN), float(MAX)
-            # correction: when 50 Ohms, Vrms MinVal must be 0.000355V
-            self.MinVal = max(self.MinVal, 0.000355)
+            batch = QueryBatch(self.instr, ';:')
+            Query(self.instr, 'VOLT? MIN', self._onMin, batch)
+            Query(self.instr, 'VOLT? MAX', self._onMax, batch)
+            Query(self.instr, 'VOLT?', self._onRead, batch)
+            batch.Run()
         return
 
-    def SetVisa(self, Instrument):
-        self.instr = Instrument
-        self._getLimit()
+    def _onMin(self, MIN):
+        # correction: when 50 Ohms, Vrms MinVal must be 0.000355V
+        self.MinVal = max(float(MIN), 0.000355)
+        return
+
+    def _onMax(self, MAX):
+        self.Maxval = float(MAX)
+        return
+
+    def _onUnit(self, S):
         x, u = self.status
-        S = self.instr.query('VOLT:UNIT?')
-        u = ['VRMS\n','VPP\n'].index(S)
+        u = ['VRMS','VPP'].index(S.strip())
         self.status = x, u
-        self._read()
+        return
+
+    # the replies are handled in the order of the queries
+    def SetVisa(self, Instrument, Batch = None):
+        self.instr = Instrument
+        self.writer = CoalescingWriter(Instrument, self.interval)
+        Query(Instrument, 'VOLT? MIN', self._onMin, Batch)
+        Query(Instrument, 'VOLT? MAX', self._onMax, Batch)
+        Query(Instrument, 'VOLT:UNIT?', self._onUnit, Batch)
+        Query(Instrument, 'VOLT?', self._onRead, Batch)
+        return
+
+    def _onRead(self, S):
+        self._onVolt(S)
         self._refresh()
         return
 
@@ -326,6 +378,8 @@ class _frequency(Control):
         self.SetFormat(SFormat)
         self.status = 0.0
         self.instr = None
+        self.writer = None
+        self.interval = _WRITE_INTERVAL
         # build control
         b = 0
         self.wheels = []        
@@ -366,14 +420,10 @@ class _frequency(Control):
             wheeln += 1
         return
 
-    # read digits
-    def _read(self):
-        x = self.status
-        if self.instr:
-            S = self.instr.query('FREQ?')
-            x = float(S)
-            x = max(x, self.MinVal)
-            x = min(x, self.Maxval)
+    def _onFreq(self, S):
+        x = float(S)
+        x = max(x, self.MinVal)
+        x = min(x, self.Maxval)
         self.status = x
         return
 
@@ -381,8 +431,8 @@ class _frequency(Control):
     def _write(self):
         x = self.status
         V = self.format % x
-        if self.instr:
-            self.instr.write('FREQ '+V)
+        if self.writer:
+            self.writer.Write('FREQ '+V)
         return
 
     # update digits or unit
@@ -402,8 +452,13 @@ class _frequency(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        self._read()
+        self.writer = CoalescingWriter(Instrument, self.interval)
+        Query(Instrument, 'FREQ?', self._onRead, Batch)
+        return
+
+    def _onRead(self, S):
+        self._onFreq(S)
         self._refresh()
         return
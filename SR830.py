@@ -19,6 +19,7 @@ from controls import *
 from display  import *
 from buttons  import *
 from numpy    import exp, log
+from visa     import ShadowRegisters, QueryBatch, Query
 
 ####################################################
 
@@ -29,6 +30,8 @@ _TIMER_DELAY = 1000
 class _panel(Control):
 
     def Start(self):
+        # no instrument yet (see SetVisa)
+        self.instr = None
         # make a dictionary of all the controls        
         CTRLS = {}
         # create Controls
@@ -89,27 +92,74 @@ class _panel(Control):
         # done
         return
 
+    # Instrument is an InstrumentWorker (see visa.py). The controls
+    # write through a shadow register map: the writes that do not
+    # change the instrument settings are not sent. The controls
+    # settings are read in a single batch of queries.
     def SetVisa(self, Instrument):
-        self.instr = Instrument
-        for CTRL in self.CTRLS.values():
-            CTRL.SetVisa(Instrument)
+        self.instr = ShadowRegisters(Instrument)
+        self.polling = False
+        self._readSettings()
         # Switch on timer
         self.Timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self._onTimer, self.Timer)
         self.Timer.Start(_TIMER_DELAY)
         return
 
-    def _onTimer(self, event):
+    # read the instrument settings again (use it when the settings
+    # have been changed from the instrument front panel)
+    def Resync(self):
         if self.instr:
-            S = self.instr.query('SNAP?1,2')
-            X, Y = S.split(',')
-            self.CTRLS['VX'].SetValue(float(X))
-            self.CTRLS['VY'].SetValue(float(Y))
-            S = self.instr.query("LIAS?")
-            self.CTRLS['UNLOCK'].SetValue(int(S))
-            self.CTRLS['OVERLOAD'].SetValue(int(S))
+            self.instr.Resync()
+            self._readSettings()
         return
 
+    # read the settings of all the controls in one round trip (the
+    # replies are read whether the instrument joins them on one line
+    # or sends one line per query, see visa.py)
+    def _readSettings(self):
+        batch = QueryBatch(self.instr, ';')
+        for CTRL in self.CTRLS.values():
+            CTRL.SetVisa(self.instr, batch)
+        batch.Run()
+        return
+
+    # the queries run in the instrument worker thread (see visa.py):
+    # the results are sent back to the GUI thread in one batch
+    def _onTimer(self, event):
+        if self.instr:
+            # skip the tick while the previous poll is pending
+            if self.polling: return
+            self.polling = True
+            future = self.instr.Submit(_poll)
+            future.add_done_callback(
+                lambda future: wx.CallAfter(self._onPoll, future))
+        return
+
+    # update the displays (runs in the GUI thread)
+    def _onPoll(self, future):
+        # the panel has been destroyed
+        if not self: return
+        self.polling = False
+        if future.cancelled(): return
+        if future.exception():
+            print("in 'SR830.py',")
+            print(f"poll failed: {future.exception()}")
+            return
+        S, L = future.result()
+        X, Y = S.split(',')
+        self.CTRLS['VX'].SetValue(float(X))
+        self.CTRLS['VY'].SetValue(float(Y))
+        self.CTRLS['UNLOCK'].SetValue(int(L))
+        self.CTRLS['OVERLOAD'].SetValue(int(L))
+        return
+
+# the polling queries (runs in the instrument worker thread)
+def _poll(Resource):
+    S = Resource.query('SNAP?1,2')
+    L = Resource.query('LIAS?')
+    return S, L
+
 ####################################################
 
 def MiniControl(Ctrl, Names):
@@ -178,9 +228,9 @@ class _sensitivity(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        self.SetValue(int(self.instr.query('SENS?')))
+        Query(Instrument, 'SENS?', lambda S: self.SetValue(int(S)), Batch)
         return
 
     # set led values according to the status value
@@ -256,9 +306,9 @@ class _timeConstant(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        self.SetValue(int(self.instr.query('OFLT?')))
+        Query(Instrument, 'OFLT?', lambda S: self.SetValue(int(S)), Batch)
         return
 
     def _refresh(self):
@@ -329,9 +379,9 @@ class _single(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        self.SetValue(int(self.instr.query(self.VISA+'?')))
+        Query(Instrument, self.VISA+'?', lambda S: self.SetValue(int(S)), Batch)
         return
 
 ####################################################
@@ -500,7 +550,7 @@ class _unlock(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         pass
 
 ####################################################
@@ -539,7 +589,7 @@ class _overload(Control):
         self._refresh()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         pass
 
 ####################################################
@@ -577,9 +627,9 @@ class _sync(Control):
         self.SendEvent()
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        self.SetValue(int(self.instr.query('SYNC?')))
+        Query(Instrument, 'SYNC?', lambda S: self.SetValue(int(S)), Batch)
         return
 
 ####################################################
@@ -651,10 +701,9 @@ class _phase(Control):
         self.status = Value
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         self.instr = Instrument
-        X = self.instr.query('PHAS?')
-        self.SetValue(float(X))
+        Query(Instrument, 'PHAS?', lambda X: self.SetValue(float(X)), Batch)
         return
 
     def _update(self, event):
@@ -753,7 +802,7 @@ class _signal(Control):
         # done
         return
 
-    def SetVisa(self, Instrument):
+    def SetVisa(self, Instrument, Batch = None):
         pass
 
 class _Vx(_signal):
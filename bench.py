@@ -0,0 +1,295 @@
+# 'bench.py'
+# content; rendering benchmarks for graph.py and plot.py.
+# author; Roch schanen
+# created; 2026 October 18
+# repository; https://github.com/RochSchanen/rochpygui
+
+# usage: python bench.py [--points 1e2 1e3 ...] [--sizes 600x600 ...]
+#                        [--repeat 5] [--output bench.json]
+#
+# The benchmarks run offscreen: when no display is available, a local
+# virtual X server (Xvfb) is started for the duration of the run. The
+# results are written as a json file: one record per measurement with
+# the best and mean times in seconds. Compare two result files to check
+# that an optimisation is a real gain, or to catch a regression.
+
+# python: https://www.python.org/
+import os, sys, time, json, argparse, subprocess, platform
+
+# run from the project folder (the theme resources are found from there)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+###############################################################################
+################################### DISPLAY ###################################
+###############################################################################
+
+# start a virtual X server when no display is defined
+# (returns the server process, or None if not started)
+def _startDisplay():
+    if os.environ.get('DISPLAY'): return None
+    for n in range(99, 199):
+        # display already in use
+        if os.path.exists(f'/tmp/.X{n}-lock'): continue
+        try:
+            process = subprocess.Popen(
+                ['Xvfb', f':{n}', '-screen', '0', '4096x4096x24', '-nolisten', 'tcp'],
+                stdout = subprocess.DEVNULL,
+                stderr = subprocess.DEVNULL)
+        except FileNotFoundError:
+            print("in 'bench.py',")
+            print("no display defined and Xvfb is not installed.")
+            sys.exit(1)
+        # wait for the server socket
+        for i in range(50):
+            if os.path.exists(f'/tmp/.X11-unix/X{n}'):
+                os.environ['DISPLAY'] = f':{n}'
+                return process
+            if process.poll() is not None: break
+            time.sleep(0.1)
+        process.kill()
+    print("in 'bench.py',")
+    print("failed to start Xvfb.")
+    sys.exit(1)
+
+# the display must be defined before wx is imported
+_XVFB = _startDisplay()
+
+# wxpython: https://www.wxpython.org/
+import wx
+
+# numpy: https://numpy.org/
+import numpy
+from numpy import linspace, cumsum, arange
+from numpy.random import default_rng
+
+# LOCAL
+from plot import *
+
+###############################################################################
+################################### TIMING ####################################
+###############################################################################
+
+# time Repeat calls of Function. Setup is called before each
+# call and is not timed. Returns the best and the mean times.
+def _time(Function, Repeat, Setup = None):
+    T = []
+    for i in range(Repeat):
+        if Setup: Setup()
+        t = time.perf_counter()
+        Function()
+        T.append(time.perf_counter()-t)
+    return min(T), sum(T)/len(T)
+
+# random walk data set of n points (sorted x)
+def _data(n):
+    rng = default_rng(0)
+    x = linspace(-10.0, +10.0, n)
+    y = cumsum(rng.standard_normal(n))
+    y = 8.0*y/max(abs(y).max(), 1.0)
+    return x, y
+
+###############################################################################
+################################## BENCHMARKS #################################
+###############################################################################
+
+class _bench():
+
+    def __init__(self, Frame, Repeat):
+        self.frame   = Frame
+        self.repeat  = Repeat
+        self.results = []
+        return
+
+    def _record(self, Name, Points, Size, Function, Setup = None):
+        best, mean = _time(Function, self.repeat, Setup)
+        W, H = Size
+        self.results.append({
+            'name'   : Name,
+            'points' : Points,
+            'size'   : [W, H],
+            'best'   : best,
+            'mean'   : mean,
+            'repeat' : self.repeat})
+        print(f'{Name:24} {Points:>10} {W:>5}x{H:<5} {best:10.6f} {mean:10.6f}')
+        return
+
+    # Graph.Draw() and its parts on a memory device context.
+    # "cold" measurements clear the layout cache before each call.
+    def Graph(self, n, Size):
+        W, H = Size
+        graph = Graph()
+        graph.SetSize(Size)
+        graph.SetFont(Theme.GetFont())
+        graph.SetBorder(60, 60, 30, 50)
+        graph.SetLimit(-11.0, +11.0, -11.0, +11.0)
+        graph.SetXFormat([2, 2])
+        graph.SetYFormat([2, 2])
+        graph.StyleSet(DRAW_AXIS | DRAW_GRID | DRAW_PLOTS | DRAW_LABELS)
+        plot = graph.AddPlot()
+        plot.SetData(*_data(n))
+        plot.SetPointStyle(['RED', 'SMALL'])
+        bitmap = wx.Bitmap(W, H, wx.BITMAP_SCREEN_DEPTH)
+        dc = wx.MemoryDC(bitmap)
+        dc.SetFont(graph.font)
+        # clear the layout and text caches
+        def clear():
+            graph._cache.Clear()
+            graph._texts.Clear()
+            return
+        self._record('Draw',             n, Size, lambda: graph.Draw(dc), clear)
+        self._record('Draw (warm)',      n, Size, lambda: graph.Draw(dc))
+        self._record('_drawGrid',        n, Size, lambda: graph._drawGrid(dc), clear)
+        self._record('_drawGrid (warm)', n, Size, lambda: graph._drawGrid(dc))
+        self._record('_drawLabels',      n, Size, lambda: graph._drawLabels(dc), clear)
+        self._record('_drawLabels (warm)', n, Size, lambda: graph._drawLabels(dc))
+        self._record('_drawPlots',       n, Size, lambda: graph._drawPlots(dc))
+        self._record('Render',           n, Size, lambda: graph.Render())
+        dc.SelectObject(wx.NullBitmap)
+        return
+
+    # GraphicScreen buffer and paint (one buffered plot and one
+    # on paint plot of n points each)
+    def Screen(self, n, Size):
+        W, H = Size
+        screen = GraphicScreen(self.frame, W, H)
+        # draw the tiles during the paint (timed)
+        screen.SetThreadedRendering(False)
+        screen.SetXLimit(-11.0, +11.0)
+        screen.SetYLimit(-11.0, +11.0)
+        buffered = screen.AddBufferedPlot()
+        buffered.SetData(*_data(n))
+        buffered.SetPointStyle(['RED', 'SMALL'])
+        onpaint = screen.AddPlot()
+        x, y = _data(n)
+        onpaint.SetData(x, -y)
+        onpaint.SetPointStyle(['BLUE', 'SMALL'])
+        screen.RefreshBuffer()
+        # discard the tiles and invalidate the cached plot layers
+        def invalidate():
+            screen.tiles.Clear()
+            for layer in screen.layers.values(): layer.Invalidate()
+            return
+        # synchronous repaint (runs Screen._onPaint)
+        def paint():
+            screen.Refresh()
+            screen.Update()
+            return
+        # change of scale (new canvas mapping: all the tiles are
+        # discarded) followed by a synchronous full paint
+        self.zoom = 0
+        def rescale():
+            self.zoom = 1-self.zoom
+            span = [11.0, 10.0][self.zoom]
+            screen.SetXLimit(-span, +span)
+            screen.Flush() # RefreshBuffer() and Refresh()
+            screen.Update()
+            return
+        self._record('rescale',          n, Size, rescale)
+        self._record('_onPaint',         n, Size, paint, invalidate)
+        self._record('_onPaint (warm)',  n, Size, paint)
+        # tool drawings only (the frame is kept)
+        def overlay():
+            screen.RefreshOverlay()
+            screen.Update()
+            return
+        self._record('overlay',          n, Size, overlay)
+        # drag by a quarter of the screen (new tiles exposed)
+        def drag():
+            x, y = screen.position
+            screen.position = x+W//4, y
+            paint()
+            screen.RefreshBuffer()
+            return
+        self._record('drag',             n, Size, drag)
+        screen.Destroy()
+        return
+
+    # strip chart: one display update for 1/30 s of samples at 1 kHz
+    # (ring of n points, the window shows the last 10% of the ring)
+    def Stream(self, n, Size):
+        W, H = Size
+        screen = GraphicScreen(self.frame, W, H)
+        screen.SetThreadedRendering(False)
+        plot = screen.AddBufferedPlot()
+        plot.SetMaxLength(n)
+        x, y = _data(n)
+        plot.Extend(arange(n), y)
+        plot.SetPointStyle(['RED', 'SMALL'])
+        screen.StartStreaming(n/10)
+        screen.streamTimer.Stop() # ticks are timed below
+        self.count = n
+        def tick():
+            k = self.count
+            plot.Extend(arange(k, k+33), y[arange(k, k+33) % n])
+            self.count = k+33
+            screen._onStream(None)
+            screen.Flush()
+            screen.Refresh()
+            screen.Update()
+            return
+        tick() # first tick draws all tiles
+        self._record('stream tick', n, Size, tick)
+        screen.Destroy()
+        return
+
+    # InteractiveGraph Yfit and Xfit (fixed screen size)
+    def Fit(self, n):
+        ig = InteractiveGraph(self.frame)
+        ig.Graph.SetThreadedRendering(False)
+        buffered = ig.Graph.AddBufferedPlot()
+        buffered.SetData(*_data(n))
+        buffered.SetPointStyle(['RED', 'SMALL'])
+        ig.Graph.RefreshBuffer()
+        # the fit handlers only read the event status
+        class event(): status = 1
+        self._record('YfitEvent', n, ig.Graph.GetSize(), lambda: ig.YfitEvent(event))
+        self._record('XfitEvent', n, ig.Graph.GetSize(), lambda: ig.XfitEvent(event))
+        ig.Destroy()
+        return
+
+###############################################################################
+##################################### MAIN ####################################
+###############################################################################
+
+def _main():
+    parser = argparse.ArgumentParser(description = 'rendering benchmarks')
+    parser.add_argument('--points', nargs = '+', type = float,
+        default = [1e2, 1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument('--sizes', nargs = '+',
+        default = ['300x300', '600x600', '1200x900'])
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--output', default = 'bench.json')
+    args = parser.parse_args()
+    points = [int(n) for n in args.points]
+    sizes  = [tuple(int(v) for v in s.split('x')) for s in args.sizes]
+    # wx setup
+    app = wx.App(False)
+    frame = wx.Frame(None, size = (4000, 4000))
+    frame.Show(True)
+    # run
+    bench = _bench(frame, args.repeat)
+    print(f'{"name":24} {"points":>10} {"size":^11} {"best":>10} {"mean":>10}')
+    for n in points:
+        for size in sizes:
+            bench.Graph(n, size)
+            bench.Screen(n, size)
+            bench.Stream(n, size)
+        bench.Fit(n)
+    frame.Destroy()
+    # save
+    with open(args.output, 'w') as f:
+        json.dump({
+            'date'    : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python'  : platform.python_version(),
+            'wx'      : wx.version(),
+            'numpy'   : numpy.__version__,
+            'platform': platform.platform(),
+            'results' : bench.results}, f, indent = 1)
+    print(f'results written to "{args.output}"')
+    return
+
+if __name__ == '__main__':
+    try:
+        _main()
+    finally:
+        if _XVFB: _XVFB.terminate()
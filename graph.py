@@ -19,9 +19,17 @@ import wx
 
 # numpy: https://numpy.org/
 from numpy import exp, log10, floor, ceil, linspace, array
+from numpy import zeros, uint8, rint, unique, nonzero, argsort, stack
+from numpy import arange, repeat, append, diff, flatnonzero, concatenate
+from numpy import minimum, maximum, empty, asarray, searchsorted, inf
+from numpy import where, log2, isfinite, int64, isnan
+
+# python: https://www.python.org/
+from collections import OrderedDict
 
 # LOCAL IMPORTS
-from theme import *
+from theme  import *
+from raster import *
 
 ###############################################################################
 ################################# GRAPH #######################################
@@ -47,6 +55,47 @@ DRAW_LABELS = (DRAW_LABEL_BOTTOM
              | DRAW_LABEL_RIGHT
              | DRAW_LABEL_LEFT)
 
+# pens as ((r, g, b, a), width, style) tuples (see _setPen())
+_BOX_PEN     = (150, 150, 150, 255), 1, wx.PENSTYLE_SOLID
+_AXIS_PEN    = (150, 150, 150, 255), 3, wx.PENSTYLE_SOLID
+_GRID_PEN    = (150, 150, 150, 255), 1, wx.PENSTYLE_SOLID
+_SUBGRID_PEN = ( 70,  70,  70, 255), 1, wx.PENSTYLE_SOLID
+
+# set a pen tuple: the rasters are drawn by worker threads,
+# where no wx object must be created (see raster.py)
+def _setPen(dc, pen):
+    if isinstance(dc, RasterDC):
+        dc.SetPen(pen)
+    else:
+        colour, width, style = pen
+        dc.SetPen(wx.Pen(wx.Colour(*colour), width, style))
+    return
+
+# small least recently used cache
+class _cache():
+
+    def __init__(self, Size):
+        self.size  = Size
+        self.items = OrderedDict()
+        return
+
+    # get the value of key: if the key is not
+    # found, the value is computed and stored
+    def Get(self, key, compute):
+        if key in self.items:
+            self.items.move_to_end(key)
+            return self.items[key]
+        value = compute()
+        self.items[key] = value
+        # evict the least recently used
+        if len(self.items) > self.size:
+            self.items.popitem(last = False)
+        return value
+
+    def Clear(self):
+        self.items.clear()
+        return
+
 class Graph():
 
     def __init__(self):
@@ -57,6 +106,7 @@ class Graph():
         # style defines which elements are drawn onto the bitmap and how:
         self.style      = 0     # default style
         self.ticks      = 7, 7  # expected number of ticks on the grid (x and y)
+        self.tickLimit  = None  # limits used for the ticks intervals (default: limit)
         self.font       = None
         self.leftText   = ""
         self.bottomText = ""
@@ -67,20 +117,36 @@ class Graph():
         self.scale     = None        
         # extra border        
         self.EB = 5 
+        # ticks and labels layout cache
+        self._cache = _cache(8)
+        # text bitmaps cache (labels and titles)
+        self._texts = _cache(256)
         # done
         return
 
     def Draw(self, dc):
         if self.scale:
+            # no text on rasters
+            text = not isinstance(dc, RasterDC)
             if self.style & DRAW_GRID:   self._drawGrid(dc)
             if self.style & DRAW_AXIS:   self._drawAxis(dc)
             if self.style & DRAW_BOX:    self._drawBox(dc)
-            if self.style & DRAW_LABELS: self._drawLabels(dc)
+            if self.style & DRAW_LABELS:
+                if text: self._drawLabels(dc)
             if self.style & DRAW_PLOTS:  self._drawPlots(dc)
-            self._drawTitles(dc)
+            if text: self._drawTitles(dc)
         # else: print("_graph.Draw(): undefined scale.")
         return
 
+    # draw into a numpy RGBA raster: no display is required
+    # (see "raster.py"). Use GetBitmap() on the returned raster
+    # to get a bitmap, or SaveFile() to export it.
+    def Render(self, Colour = (0, 0, 0, 255)):
+        W, H = self.size
+        dc = RasterDC(W, H, Colour)
+        self.Draw(dc)
+        return dc
+
     def SetSize(self, Size):
         self.size = Size
         self._setScale()
@@ -175,7 +241,7 @@ class Graph():
         l, r, t, b = self.border
         # setup style
         dc.SetBrush(wx.TRANSPARENT_BRUSH)
-        dc.SetPen(wx.Pen(wx.Colour(150,150,150), 1.0))
+        _setPen(dc, _BOX_PEN)
         # draw box
         dc.DrawRectangle(l, t, W-l-r, H-t-b)
         # done
@@ -189,7 +255,7 @@ class Graph():
         if self.style & SKIP_BORDERS: l, r, t, b = 0, 0, 0, 0
         # setup style
         dc.SetBrush(wx.TRANSPARENT_BRUSH)
-        dc.SetPen(wx.Pen(wx.Colour(150,150,150), 3))
+        _setPen(dc, _AXIS_PEN)
         # draw Axis
         dc.DrawLine(X, t, X, H-b-1)
         dc.DrawLine(l, Y, W-r-1, Y)
@@ -197,39 +263,55 @@ class Graph():
         return
 
     def _drawGrid(self, dc):
+        # get geometry
+        W, H = self.size
+        l, r, t, b = self.border
+        if self.style & SKIP_BORDERS: l, r, t, b = 0, 0, 0, 0
+        # get tick positions in pixels (cached; the scale
+        # depends on the border even when the borders are skipped)
+        key = ('GRID', self.limit, self.tickLimit, tuple(self.size),
+            tuple(self.border), self.style & SKIP_BORDERS, self.ticks)
+        MX, MY, SX, SY = self._cache.Get(key, self._getGrid)
+        # set sub grid style
+        _setPen(dc, _SUBGRID_PEN)
+        # draw grid lines
+        for x in SX: dc.DrawLine(x, t, x, H-b-1)
+        for y in SY: dc.DrawLine(l, y, W-r-1, y)
+        # set main grid style
+        _setPen(dc, _GRID_PEN)
+        # draw grid lines
+        for x in MX: dc.DrawLine(x, t, x, H-b-1)
+        for y in MY: dc.DrawLine(l, y, W-r-1, y)
+        # done
+        return
+
+    # get main and sub grid positions (pixels)
+    def _getGrid(self):
         # get geometry
         W, H = self.size
         # X, Y = self._getPixels(0.0, 0.0)
         l, r, t, b = self.border
         if self.style & SKIP_BORDERS: l, r, t, b = 0, 0, 0, 0
         xs, xe, ys, ye = self.limit
+        # graphs drawn in pieces (tiles) share the same ticks intervals
+        if self.tickLimit: xs, xe, ys, ye = self.tickLimit
         # get style
         nx, ny = self.ticks
         # get ticks intervals
         mix, six = self._getTKI(xs, xe, nx)
         miy, siy = self._getTKI(ys, ye, ny)
-        # find edge coordinates
-        xs, ys = self._getCoords(l, H-b-1)
-        xe, ye = self._getCoords(W-r-1, t)
+        # find edge coordinates (pieces: include the lines next to the edges)
+        e = 1 if self.tickLimit else 0
+        xs, ys = self._getCoords(l-e, H-b-1+e)
+        xe, ye = self._getCoords(W-r-1+e, t-e)
         # get buffer ticks positions (coordinates)
         mpx, spx = self._getTKP(xs, xe, mix, six)
         mpy, spy = self._getTKP(ys, ye, miy, siy)
-        # set sub grid style
-        dc.SetPen(wx.Pen(wx.Colour(70,70,70), 1.0))
-        # Get tik positions in pixels
-        X, Y = self._getPixels(spx, spy)
-        # draw grid lines
-        for x in X: dc.DrawLine(x, t, x, H-b-1)
-        for y in Y: dc.DrawLine(l, y, W-r-1, y)
-        # set main grid style
-        dc.SetPen(wx.Pen(wx.Colour(150,150,150), 1.0))
         # Get tik positions in pixels
-        X, Y = self._getPixels(mpx, mpy)
-        # draw grid lines
-        for x in X: dc.DrawLine(x, t, x, H-b-1)
-        for y in Y: dc.DrawLine(l, y, W-r-1, y)
+        MX, MY = self._getPixels(mpx, mpy)
+        SX, SY = self._getPixels(spx, spy)
         # done
-        return
+        return MX, MY, SX, SY
 
     # get Interval for an optimum number of ticks
     def _getTKI(self, valStart, valStop, nTicks):
@@ -271,6 +353,52 @@ class Graph():
         return mp, sp
 
     def _drawLabels(self, dc):
+        # get labels layout (cached)
+        labels = self.GetLabels(dc)
+        # set style
+        dc.SetFont(self.font)
+        dc.SetTextForeground(wx.Colour(180,180,180))
+        # draw labels
+        for lT, p, q, lW, lH in labels:
+            dc.DrawBitmap(self._getText(dc, lT), int(p), int(q))
+
+            if DEBUG:
+                dc.SetBrush(wx.TRANSPARENT_BRUSH)
+                dc.DrawRectangle(p, q, lW, lH)
+        # done
+        return
+
+    # get the list of labels to draw (cached, see _getLabels())
+    def GetLabels(self, dc):
+        font = self.font.GetNativeFontInfoDesc() if self.font else None
+        key = ('LABELS', self.limit, tuple(self.size), self.border, self.ticks,
+            tuple(self.xFormat), tuple(self.yFormat), font,
+            self.style & DRAW_LABELS)
+        return self._cache.Get(key, lambda: self._getLabels(dc))
+
+    # Get the bitmap of a text (cached): the text is drawn once onto
+    # a transparent bitmap, which is then copied as many times as
+    # needed. Angle is 0 (horizontal) or 90 (vertical, upwards).
+    def _getText(self, dc, text, angle = 0):
+        font = self.font.GetNativeFontInfoDesc()
+        def compute():
+            dc.SetFont(self.font)
+            w, h = dc.GetTextExtent(text)
+            if angle == 90: w, h = h, w
+            bitmap = wx.Bitmap.FromRGBA(w, h, 0, 0, 0, 0)
+            mdc = wx.MemoryDC(bitmap)
+            gc = wx.GCDC(mdc) # alpha aware device context
+            gc.SetFont(self.font)
+            gc.SetTextForeground(wx.Colour(180,180,180))
+            if angle == 90: gc.DrawRotatedText(text, 0, h, 90)
+            else:           gc.DrawText(text, 0, 0)
+            del gc
+            mdc.SelectObject(wx.NullBitmap)
+            return bitmap
+        return self._texts.Get(('TEXT', text, angle, font), compute)
+
+    # get the list of labels to draw: (text, x, y, width, height)
+    def _getLabels(self, dc):
         # get geometry
         W, H = self.size
         # X, Y = self._getPixels(0.0, 0.0)
@@ -289,58 +417,45 @@ class Graph():
         mpy, spy = self._getTKP(ys, ye, miy, siy)
         # get mains tick positions (pixels)
         X, Y = self._getPixels(mpx, mpy)
-        # set style
+        # set style (text extent)
         dc.SetFont(self.font)
-        dc.SetTextForeground(wx.Colour(180,180,180))
+        # labels list
+        labels = []
 
         if self.style & (DRAW_LABEL_BOTTOM | DRAW_LABEL_TOP):
             # get formatting
             n, d = self.xFormat # length, decimals
             f = f'%.{d}f'       # string format
-            # draw horizontal labels
+            # get horizontal labels
             for x, v in zip(X, mpx):
                 # get label string
                 lT = f % v                                   
-                lW, lH = dc.GetTextExtent(lT) # get size
+                lW, lH = self._getText(dc, lT).GetSize() # get size
                 p = x-lW/2                    # get position
                 p = max(p, l)                 # coerce to min
                 p = min(p, W-r-lW)            # coerce to max
                 if self.style & DRAW_LABEL_TOP:
-                    dc.DrawText(lT, p, t-lH)
+                    labels.append((lT, p, t-lH, lW, lH))
                 if self.style & DRAW_LABEL_BOTTOM:
-                    dc.DrawText(lT, p, H-b)
-
-                if DEBUG:
-                    dc.SetBrush(wx.TRANSPARENT_BRUSH)
-                    if self.style & DRAW_LABEL_TOP:
-                        dc.DrawRectangle(p, t-lH, lW, lH)
-                    if self.style & DRAW_LABEL_BOTTOM:
-                        dc.DrawRectangle(p, H-b, lW, lH)
+                    labels.append((lT, p, H-b, lW, lH))
 
         if self.style & (DRAW_LABEL_LEFT | DRAW_LABEL_RIGHT):
             # get formatting
             n, d = self.yFormat # length, decimals
             f = f'%.{d}f'       # string format
-            # draw horizontal labels
+            # get vertical labels
             for y, v in zip(Y, mpy):
                 # get label string
                 lT = f % v                                   
-                lW, lH = dc.GetTextExtent(lT) # get size
+                lW, lH = self._getText(dc, lT).GetSize() # get size
                 q = y-lH/2                    # get position
                 # no coercion in this case
                 if self.style & DRAW_LABEL_LEFT:
-                    dc.DrawText(lT, l-lW-self.EB, q)
+                    labels.append((lT, l-lW-self.EB, q, lW, lH))
                 if self.style & DRAW_LABEL_RIGHT:
-                    dc.DrawText(lT, W-r+self.EB, q)
-
-                if DEBUG:
-                    dc.SetBrush(wx.TRANSPARENT_BRUSH)
-                    if self.style & DRAW_LABEL_LEFT:
-                        dc.DrawRectangle(l-lW-self.EB, q, lW, lH)
-                    if self.style & DRAW_LABEL_RIGHT:
-                        dc.DrawRectangle(W-r+self.EB, q, lW, lH)
+                    labels.append((lT, W-r+self.EB, q, lW, lH))
         # done
-        return
+        return labels
 
     def _drawTitles(self, dc):
         if self.font:
@@ -351,48 +466,123 @@ class Graph():
             dc.SetTextForeground(wx.Colour(180,180,180))
             # draw left
             if len(self.leftText):
-                lT = self.leftText
-                lW, lH = dc.GetTextExtent(lT)
-                dc.DrawRotatedText(lT, 0, H/2+lW/2, 90)
+                bitmap = self._getText(dc, self.leftText, 90)
+                lH, lW = bitmap.GetSize()
+                dc.DrawBitmap(bitmap, 0, int(H/2-lW/2))
             # draw botttom
             if len(self.bottomText):
-                lT = self.bottomText
-                lW, lH = dc.GetTextExtent(lT)
-                dc.DrawRotatedText(lT, W/2-lW/2, H-lH, 0)
+                bitmap = self._getText(dc, self.bottomText)
+                lW, lH = bitmap.GetSize()
+                dc.DrawBitmap(bitmap, int(W/2-lW/2), H-lH)
         return
 
     def _drawPlots(self, dc):
         # get geometry
-        W, H = self.size
-        l, r, t, b = self.border
-        if self.style & SKIP_BORDERS: l, r, t, b = 0, 0, 0, 0
-        dc.SetClippingRegion(l, t, W-l-r, H-t-b)
+        clip = self._getClip()
+        dc.SetClippingRegion(*clip)
         # draw
         for plot in self.plots:
-            if len(plot.x) and len(plot.y):
-                # get data
-                X, Y   = self._getPixels(plot.x, plot.y)
-                points = list(zip(X, Y))
-                bitmap = plot.point
-                pw, ph = bitmap.GetSize()
-                pw, ph = round(pw/2), round(ph/2)
-                # draw lines
-                dc.SetPen(plot.pen)
-                dc.DrawLines(points)
-                # draw points
-                for x, y in points:
-                    dc.DrawBitmap(bitmap, x-pw, y-ph)
-
-                if DEBUG:
-                    for x, y in points:
-                        dc.SetPen(wx.Pen(wx.Colour(100,100,100)))
-                        dc.DrawRectangle(x-pw, y-pw, 2*pw, 2*ph)
-                        dc.SetPen(wx.Pen(wx.Colour(255,255,255)))
-                        dc.DrawPoint(x, y)
+            self._drawPlot(dc, plot, clip)
         # done
         dc.DestroyClippingRegion()
         return
 
+    # draw the points i0:i1 of a plot (default: all). When Connect
+    # is set, the first point is only used to connect the line to
+    # the points already drawn (its marker is not drawn again).
+    def DrawPlot(self, dc, plot, i0 = None, i1 = None, Connect = False):
+        if self.scale:
+            clip = self._getClip()
+            dc.SetClippingRegion(*clip)
+            self._drawPlot(dc, plot, clip, i0, i1, Connect)
+            dc.DestroyClippingRegion()
+        return
+
+    # get plot area (x, y, w, h)
+    def _getClip(self):
+        W, H = self.size
+        l, r, t, b = self.border
+        if self.style & SKIP_BORDERS: l, r, t, b = 0, 0, 0, 0
+        return l, t, W-l-r, H-t-b
+
+    def _drawPlot(self, dc, plot, clip, i0 = None, i1 = None, connect = False):
+        l, t, w, h = clip
+        # get visible range
+        j0, j1 = self._getRange(plot, clip)
+        if i0 is not None: j0 = max(j0, i0)
+        if i1 is not None: j1 = min(j1, i1)
+        if j1 <= j0: return
+        # get data (markers use all the visible points)
+        X, Y = self._getPixels(plot.x[j0:j1], plot.y[j0:j1])
+        x, y = X, Y
+        if plot.decimation == 'AUTO':
+            # dense sorted plots: the line uses the min/max pyramid
+            # (blocks of points only match pixel columns when x is sorted)
+            I = plot._select(j0, j1, w) if plot.sorted else None
+            if I is not None: x, y = X[I-j0], Y[I-j0]
+            # reduce the number of line vertices
+            if len(x) > 4*w: x, y = _decimate(x, y)
+        # draw lines
+        if isinstance(dc, RasterDC):
+            dc.SetPen(plot.penSpec)
+            dc.DrawLines(stack((x, y), 1))
+        else:
+            dc.SetPen(plot.pen)
+            dc.DrawLines(list(zip(x, y)))
+        # skip the connecting point
+        if connect and j0 == i0: X, Y = X[1:], Y[1:]
+        # draw points
+        self._drawMarkers(dc, plot, X, Y, clip)
+
+        if DEBUG:
+            points = list(zip(X, Y))
+            pw, ph = plot.point.GetSize()
+            pw, ph = round(pw/2), round(ph/2)
+            for x, y in points:
+                dc.SetPen(wx.Pen(wx.Colour(100,100,100)))
+                dc.DrawRectangle(x-pw, y-pw, 2*pw, 2*ph)
+                dc.SetPen(wx.Pen(wx.Colour(255,255,255)))
+                dc.DrawPoint(x, y)
+        # done
+        return
+
+    # get the range of indices of the points of a plot that can be
+    # seen in the clip area. When x is sorted, the range is found
+    # by binary search and includes one more point on each side
+    # (for the lines). Otherwise, the range is the whole data set.
+    def _getRange(self, plot, clip):
+        n = len(plot.x)
+        if not plot.sorted: return 0, n
+        # get geometry
+        l, t, w, h = clip
+        K, ox, oy = plot.kernel
+        kw = K.shape[1]
+        # get x limits (including the size of the markers)
+        xs, ys = self._getCoords(l-ox-kw, t)
+        xe, ye = self._getCoords(l+w-ox, t)
+        xs, xe = min(xs, xe), max(xs, xe)
+        # binary search
+        i0 = searchsorted(plot.x, xs, 'left')-1
+        i1 = searchsorted(plot.x, xe, 'right')+1
+        # done
+        return max(i0, 0), min(i1, n)
+
+    # all the point markers of a plot are stamped into
+    # a single RGBA raster which is drawn in one call
+    def _drawMarkers(self, dc, plot, X, Y, clip):
+        # stamp markers
+        R = _stampMarkers(X, Y, plot.kernel, clip)
+        if R is None: return
+        layer, x, y = R
+        h, w = layer.shape[:2]
+        # draw raster
+        if isinstance(dc, RasterDC):
+            dc.DrawRaster(layer, x, y)
+        else:
+            dc.DrawBitmap(wx.Bitmap.FromBufferRGBA(w, h, layer), x, y)
+        # done
+        return
+
     def AddPlot(self):
         # create object
         p = _plot()
@@ -406,22 +596,231 @@ class _plot():
     def __init__(self):
         # LOCAL
         self.pen        = None
+        self.penSpec    = None # pen parameters (see raster.py)
         self.point      = None
+        self.kernel     = None
         self.colour     = None
         # DEFAULTS
         self.pointStyle = 'DOT','WHITE','MEDIUM'
         self.lineStyle  = 'SOLID','THIN'
+        self.decimation = 'AUTO'
         # PARAMETERS
         self.x = array([])
         self.y = array([])
+        self.maxLength = None # maximum number of points (None: no limit)
+        self.sorted    = True # x values are in increasing order
+        # changes (used for incremental drawing)
+        self.revision  = 0    # incremented when the plot is modified
+        self.total     = 0    # number of points added since the last
+                              # SetData() (including dropped points)
+        self.dropped   = 0    # number of points dropped since then
+        # STORAGE (self.x and self.y are views of the storage arrays)
+        self._x, self._y = self.x, self.y
+        self._s, self._e = 0, 0 # start and end of the data in storage
+        self._pyramid = None    # min/max pyramid (built when needed)
+        self._grid    = None    # pixel grid hash (built when needed)
         # setup
         self.SetPointStyle() # calls SetLineStyle()
         # done
         return
 
     def SetData(self, X, Y):
-        self.x = array(X)
-        self.y = array(Y)
+        self._x = array(X, float)
+        self._y = array(Y, float)
+        self._s, self._e = 0, min(len(self._x), len(self._y))
+        self._pyramid = None
+        self.total, self.dropped = self._e, 0
+        self._trim()
+        self.SetSorted()
+        self.revision += 1
+        return
+
+    # declare x as sorted (True) or not sorted (False)
+    # or check the data (None). When x is sorted, only
+    # the visible part of the plot is drawn.
+    def SetSorted(self, Value = None):
+        if Value is None:
+            Value = (diff(self.x) >= 0).all()
+        self.sorted = bool(Value)
+        return
+
+    def Clear(self):
+        self.SetData([], [])
+        return
+
+    # add one point
+    def Append(self, x, y):
+        self.Extend([x], [y])
+        return
+
+    # add a set of points: the storage grows by doubling its size
+    # so that the appending cost does not depend on the number of
+    # points already stored (no copy of the data on each call)
+    def Extend(self, X, Y):
+        X = asarray(X, float).ravel()
+        Y = asarray(Y, float).ravel()
+        self.total += min(len(X), len(Y))
+        # only the last points can be kept
+        if self.maxLength:
+            X, Y = X[-self.maxLength:], Y[-self.maxLength:]
+        n = min(len(X), len(Y))
+        # check that x remains sorted
+        if self.sorted and n:
+            last = self._x[self._e-1] if self._e > self._s else -inf
+            self.sorted = bool(X[0] >= last and (diff(X[:n]) >= 0).all())
+        # make room
+        if self._e+n > len(self._x): self._grow(n)
+        # store data
+        e = self._e
+        self._x[e:e+n] = X[:n]
+        self._y[e:e+n] = Y[:n]
+        self._e = e+n
+        # update pyramid
+        if self._pyramid: self._pyramid.Update(self._y, self._e)
+        # update views
+        self._trim()
+        return
+
+    # limit the number of points: the oldest points are dropped
+    def SetMaxLength(self, n):
+        self.maxLength = n
+        self._trim()
+        return
+
+    # allocate a new storage for n more points. The storage is
+    # never modified in place: views returned before remain valid.
+    def _grow(self, n):
+        s, e = self._s, self._e
+        # number of stored points to keep
+        k = e-s
+        if self.maxLength: k = max(0, min(k, self.maxLength-n))
+        # twice the size required (at most twice maxLength)
+        N = max(2*(k+n), 64)
+        if self.maxLength: N = min(N, 2*self.maxLength)
+        # copy the data kept
+        x, y = empty(N), empty(N)
+        x[:k], y[:k] = self._x[e-k:e], self._y[e-k:e]
+        # update storage
+        self._x, self._y = x, y
+        self._s, self._e = 0, k
+        # the pyramid is lost when the data are moved
+        if e-k: self._pyramid = None
+        return
+
+    # get the indices (in the views) of the points to draw for the
+    # range i0:i1 over w pixel columns. When there are many points
+    # per column, only the minimum and maximum of each block of the
+    # pyramid level matching the density are kept (two blocks or
+    # more per column). Returns None when all points must be drawn.
+    def _select(self, i0, i1, w):
+        n = i1-i0
+        if n < 8*w: return None
+        # select level
+        k = int(log2(n/w))-1
+        # done
+        s = self._s
+        return self._getPyramid().Select(s+i0, s+i1, k)-s
+
+    # build the pyramid once (then updated by Extend())
+    def _getPyramid(self):
+        if self._pyramid is None:
+            self._pyramid = _pyramid()
+            self._pyramid.Update(self._y, self._e)
+        return self._pyramid
+
+    # get the minimum and the maximum of the y values of the points
+    # such that xs <= x <= xe (None when there is no such point). When
+    # x is sorted, the cost only grows as log(n) (binary search and
+    # pyramid blocks).
+    def GetYRange(self, xs, xe):
+        if self.sorted:
+            i0 = searchsorted(self.x, xs, 'left')
+            i1 = searchsorted(self.x, xe, 'right')
+            if i1 <= i0: return None
+            s = self._s
+            imin, imax = self._getPyramid().Range(self._y, s+i0, s+i1)
+            # only nan values
+            if isnan(self._y[imin]): return None
+            return self._y[imin], self._y[imax]
+        y = self.y[(self.x >= xs) & (self.x <= xe)]
+        if not len(y): return None
+        return y.min(), y.max()
+
+    # get the minimum and the maximum of the x values of the points
+    # such that ys <= y <= ye (None when there is no such point). When
+    # x is sorted, the first and last of these points are searched
+    # through the pyramid blocks.
+    def GetXRange(self, ys, ye):
+        if self.sorted:
+            n = len(self.x)
+            if not n: return None
+            s, pyramid = self._s, self._getPyramid()
+            i = pyramid.Find(self._y, s, s+n, ys, ye, False)
+            if i is None: return None
+            j = pyramid.Find(self._y, s, s+n, ys, ye, True)
+            return self._x[i], self._x[j]
+        x = self.x[(self.y >= ys) & (self.y <= ye)]
+        if not len(x): return None
+        return x.min(), x.max()
+
+    # Get the index of the point nearest to x, y, and its squared
+    # distance, in pixels (ax and ay are the numbers of pixels per
+    # unit along x and y). Only the points closer than R pixels are
+    # considered (None when there is no such point). When x is sorted,
+    # the candidates are found by binary search. Otherwise, a hash of
+    # the points into a grid of R pixels cells is used (the grid is
+    # built again when the scale or the data change; the points
+    # appended since are tested directly until they are too many).
+    def Nearest(self, x, y, ax, ay, R = 10):
+        if not len(self.x): return None
+        if self.sorted:
+            dx = R/abs(ax)
+            i0 = searchsorted(self.x, x-dx, 'left')
+            i1 = searchsorted(self.x, x+dx, 'right')
+            I = arange(i0, i1)
+        else:
+            grid = self._getGrid(ax, ay, R)
+            # shift the grid indices by the points dropped since
+            I = grid.Get(x*ax/R, y*ay/R)-(self.dropped-grid.dropped)
+            # points appended since (the non finite values are left out)
+            J = arange(max(grid.total-self.dropped, 0), len(self.x))
+            J = J[isfinite(self.x[J]) & isfinite(self.y[J])]
+            I = concatenate((I[I >= 0], J))
+        if not len(I): return None
+        # squared distances
+        D = ((self.x[I]-x)*ax)**2 + ((self.y[I]-y)*ay)**2
+        k = D.argmin()
+        if not D[k] <= R*R: return None
+        return I[k], D[k]
+
+    def _getGrid(self, ax, ay, R):
+        key, grid = (ax, ay, R, self.revision), self._grid
+        if grid is None or grid.key != key or \
+            self.total-grid.total > max(1024, len(self.x) >> 3):
+            grid = _grid(self.x*ax/R, self.y*ay/R, key)
+            grid.total, grid.dropped = self.total, self.dropped
+            self._grid = grid
+        return grid
+
+    # drop the points exceeding maxLength and update the views
+    def _trim(self):
+        if self.maxLength:
+            self._s = max(self._s, self._e-self.maxLength)
+        self.x = self._x[self._s:self._e]
+        self.y = self._y[self._s:self._e]
+        self.dropped = self.total-len(self.x)
+        return
+
+    # 'AUTO': the line vertices are decimated when the plot has
+    # more points than four times the number of pixel columns.
+    # 'EXACT': all the points are passed to DrawLines().
+    def SetDecimation(self, Mode):
+        if Mode in ['AUTO', 'EXACT']:
+            self.decimation = Mode
+            self.revision += 1
+        else:
+            print("in 'graph.py',")
+            print("undefined decimation mode '%s'." % Mode)
         return
 
     def SetPointStyle(self, Styles = None):
@@ -454,6 +853,7 @@ class _plot():
         # store point
         lib, images = Theme.GetImages(SHAPES[shape], COLOURS[colour])
         self.point = lib.Get(COLOURS[colour] + SIZES[size])
+        self.kernel = _getKernel(self.point)
         # get colour from point bitmap
         dc = wx.MemoryDC()               # setup device context
         dc.SelectObject(self.point)      # select point as bitmap
@@ -461,7 +861,7 @@ class _plot():
         self.colour = dc.GetPixel(w/2, h/2)   # pick colour
         dc.SelectObject(wx.NullBitmap)   # release device context
         # update line color
-        self.SetLineStyle()
+        self.SetLineStyle() # increments revision
         # done
         return
 
@@ -491,6 +891,276 @@ class _plot():
         self.lineStyle = dashing, width
         # store pen
         self.pen = wx.Pen(self.colour, WIDTHS[width], DASHINGS[dashing])
+        self.penSpec = PenSpec(self.pen)
+        self.revision += 1
         # done
         return
-        
\ No newline at end of file
+        
+
+###############################################################################
+################################ MARKERS ######################################
+###############################################################################
+
+# Convert a point bitmap into an RGBA array (the kernel) cropped
+# to its visible pixels. The offset (ox, oy) of the kernel is such
+# that the kernel is drawn at the same place as the bitmap would be.
+def _getKernel(bitmap):
+    # get RGBA values
+    K = BitmapToRGBA(bitmap)
+    h, w = K.shape[:2]
+    # crop to visible pixels
+    J, I = nonzero(K[:, :, 3])
+    if not len(I): return K[:0, :0], 0, 0
+    i0, i1, j0, j1 = I.min(), I.max()+1, J.min(), J.max()+1
+    # bitmaps are centered on the data points
+    pw, ph = round(w/2), round(h/2)
+    return K[j0:j1, i0:i1].copy(), i0-pw, j0-ph
+
+# Stamp the kernel at the pixel positions (X, Y) into a
+# transparent raster covering the clip area (l, t, w, h).
+# Markers falling onto the same pixel are merged first, and
+# the kernel pixels are stamped from the most transparent to
+# the most opaque: each pixel of the raster gets the most opaque
+# kernel pixel covering it. The cost is the number of distinct
+# positions times the kernel size: not the number of points.
+# Returns the raster (cropped to the markers) and its position.
+def _stampMarkers(X, Y, kernel, clip):
+    K, ox, oy = kernel
+    kh, kw = K.shape[:2]
+    if not kh*kw: return None
+    l, t, w, h = clip
+    # skip the missing points (nan or inf)
+    I = isfinite(X) & isfinite(Y)
+    X, Y = X[I], Y[I]
+    # get kernel corners (relative to clip area)
+    X = rint(X).astype(int)+ox-l
+    Y = rint(Y).astype(int)+oy-t
+    # remove markers out of the clip area
+    I = (X > -kw) & (X < w) & (Y > -kh) & (Y < h)
+    X, Y = X[I], Y[I]
+    if not len(X): return None
+    # merge markers on the same pixel
+    P = unique((Y+kh)*(w+kw)+(X+kw))
+    Y, X = P//(w+kw)-kh, P%(w+kw)-kw
+    # get raster geometry (cropped to the markers)
+    xs, xe = max(X.min(), 0), min(X.max()+kw, w)
+    ys, ye = max(Y.min(), 0), min(Y.max()+kh, h)
+    X, Y = X-xs, Y-ys
+    w, h = xe-xs, ye-ys
+    R = zeros((h, w, 4), uint8)
+    # stamp kernel pixels by increasing opacity
+    J, I = nonzero(K[:, :, 3])
+    for n in argsort(K[J, I, 3], kind = 'stable'):
+        j, i = J[n], I[n]
+        x, y = X+i, Y+j
+        V = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        R[y[V], x[V]] = K[j, i]
+    # done
+    return R, xs+l, ys+t
+
+###############################################################################
+################################ DECIMATION ###################################
+###############################################################################
+
+# M4 decimation of a line in pixel coordinates: only the first,
+# last, minimum and maximum vertices of each run of consecutive
+# points falling into the same pixel column are kept. The drawn
+# line is unchanged. For monotonic X, this leaves at most four
+# vertices per pixel column.
+def _decimate(X, Y):
+    n = len(X)
+    C = floor(X)
+    # get runs start and length
+    S = concatenate(([0], flatnonzero(C[1:] != C[:-1])+1))
+    L = diff(append(S, n))
+    # last index of each run
+    E = S+L-1
+    # run number of each point
+    R = repeat(arange(len(S)), L)
+    # first minimum of each run
+    I = flatnonzero(Y == repeat(minimum.reduceat(Y, S), L))
+    Imin = I[unique(R[I], return_index = True)[1]]
+    # first maximum of each run
+    I = flatnonzero(Y == repeat(maximum.reduceat(Y, S), L))
+    Imax = I[unique(R[I], return_index = True)[1]]
+    # collect vertices (ordered)
+    I = unique(concatenate((S, E, Imin, Imax)))
+    return X[I], Y[I]
+
+###############################################################################
+################################## GRID #######################################
+###############################################################################
+
+# Hash of a set of points U, V into a grid of unit cells: the indices
+# of the points are sorted by cell. Get() returns the indices of the
+# points found in the 3x3 cells surrounding a position.
+class _grid():
+
+    def __init__(self, U, V, key):
+        self.key = key
+        # cell coordinates (the non finite values are left out)
+        F = isfinite(U) & isfinite(V)
+        self.index = flatnonzero(F)
+        CU = floor(U[F]).astype(int64)
+        CV = floor(V[F]).astype(int64)
+        # cells range
+        self.u0, self.v0 = (CU.min(), CV.min()) if len(CU) else (0, 0)
+        self.nu = (CU.max()-self.u0+1) if len(CU) else 0
+        self.nv = (CV.max()-self.v0+1) if len(CV) else 0
+        # sort by cell number
+        C = (CU-self.u0)*self.nv+(CV-self.v0)
+        I = argsort(C, kind = 'stable')
+        self.cells, self.index = C[I], self.index[I]
+        return
+
+    def Get(self, u, v):
+        cu, cv = int(floor(u))-self.u0, int(floor(v))-self.v0
+        I = []
+        for i in range(cu-1, cu+2):
+            if i < 0 or i >= self.nu: continue
+            # neighbouring cells in the same column are contiguous
+            j0, j1 = max(cv-1, 0), min(cv+2, self.nv)
+            if j1 <= j0: continue
+            k0 = searchsorted(self.cells, i*self.nv+j0, 'left')
+            k1 = searchsorted(self.cells, i*self.nv+j1, 'left')
+            I.append(self.index[k0:k1])
+        if not I: return empty(0, int)
+        return concatenate(I)
+
+###############################################################################
+################################# PYRAMID #####################################
+###############################################################################
+
+# Multi-resolution min/max pyramid of the y values of a plot.
+# Level k (k = 1, 2, ...) holds, for each block of 2**k consecutive
+# points, the indices of the minimum and of the maximum y value.
+# The indices refer to the plot storage arrays.
+class _pyramid():
+
+    def __init__(self):
+        self.n      = 0  # number of points covered
+        self.levels = [] # [Imin, Imax] for each level
+        return
+
+    # extend the pyramid to the first n values of Y: only
+    # the blocks containing new points are computed.
+    def Update(self, Y, n):
+        m, self.n = self.n, n
+        k = 1
+        while n > 1 << (k-1):
+            # number of blocks
+            nb = ((n-1) >> k)+1
+            # first block to compute
+            b0 = m >> k
+            # create level
+            if len(self.levels) < k:
+                self.levels.append([empty(0, int), empty(0, int)])
+            L = self.levels[k-1]
+            # grow level (doubling size)
+            if len(L[0]) < nb:
+                for i in range(2):
+                    A = empty(max(2*nb, 16), int)
+                    A[:b0] = L[i][:b0]
+                    L[i] = A
+            # children indices (first and second)
+            C = arange(2*b0, 2*nb, 2)
+            if k == 1:
+                D = minimum(C+1, n-1)
+                Amin, Amax, Bmin, Bmax = C, C, D, D
+            else:
+                D = minimum(C+1, (n-1) >> (k-1))
+                Imin, Imax = self.levels[k-2]
+                Amin, Amax, Bmin, Bmax = Imin[C], Imax[C], Imin[D], Imax[D]
+            # select extrema (nan values are only kept
+            # when the block has no other value)
+            A, B = Y[Amin], Y[Bmin]
+            L[0][b0:nb] = where((B < A) | isnan(A), Bmin, Amin)
+            A, B = Y[Amax], Y[Bmax]
+            L[1][b0:nb] = where((B > A) | isnan(A), Bmax, Amax)
+            # next level
+            k += 1
+        return
+
+    # get the ordered indices of the extrema of the blocks of level
+    # k inside the range i0:i1. The points of incomplete blocks at
+    # both ends of the range are all included.
+    def Select(self, i0, i1, k):
+        k = min(k, len(self.levels))
+        if k < 1: return arange(i0, i1)
+        Imin, Imax = self.levels[k-1]
+        # complete blocks in range
+        b0, b1 = -(-i0 >> k), i1 >> k
+        if b1 <= b0: return arange(i0, i1)
+        # order minimum and maximum in each block
+        A, B = Imin[b0:b1], Imax[b0:b1]
+        I = stack((minimum(A, B), maximum(A, B)), 1).ravel()
+        # done
+        return concatenate((arange(i0, b0 << k), I, arange(b1 << k, i1)))
+
+    # split the range i0:i1 into the largest aligned blocks: returns
+    # the list of (i, k) pairs, block of 2**k points starting at i.
+    def _blocks(self, i0, i1):
+        B, i = [], i0
+        while i < i1:
+            k = len(self.levels)
+            while k and (i % (1 << k) or i+(1 << k) > i1): k -= 1
+            B.append((i, k))
+            i += 1 << k
+        return B
+
+    # get the indices of the minimum and of the maximum of Y over the
+    # range i0:i1 (not empty, inside the first n values). The nan
+    # values are ignored (unless the range has no other value).
+    def Range(self, Y, i0, i1):
+        Imin, Imax = [], []
+        for i, k in self._blocks(i0, i1):
+            if k:
+                L = self.levels[k-1]
+                Imin.append(L[0][i >> k])
+                Imax.append(L[1][i >> k])
+            else:
+                Imin.append(i)
+                Imax.append(i)
+        Imin, Imax = array(Imin), array(Imax)
+        A, B = Y[Imin], Y[Imax]
+        A, B = where(isnan(A), inf, A), where(isnan(B), -inf, B)
+        return Imin[A.argmin()], Imax[B.argmax()]
+
+    # get the index of the first (or Last) value of Y in the range
+    # i0:i1 such that lo <= Y <= hi (None if not found). The blocks
+    # whose extrema are both inside or both on the same side of the
+    # interval are decided without looking at their points. When the
+    # values cross the interval too often (noisy data) the descent is
+    # stopped after a few blocks per level and the remaining points
+    # are tested at once.
+    def Find(self, Y, i0, i1, lo, hi, Last = False):
+        blocks = self._blocks(i0, i1)
+        if not Last: blocks.reverse()
+        count = 4*(len(self.levels)+1)
+        while blocks:
+            i, k = blocks.pop()
+            count -= 1
+            if count < 0:
+                # the blocks already visited hold no point inside
+                if Last: i1 = i+(1 << k)
+                else:    i0 = i
+                I = flatnonzero((Y[i0:i1] >= lo) & (Y[i0:i1] <= hi))
+                if not len(I): return None
+                return i0+I[-1] if Last else i0+I[0]
+            if k:
+                L = self.levels[k-1]
+                mn, mx = Y[L[0][i >> k]], Y[L[1][i >> k]]
+            else:
+                mn, mx = Y[i], Y[i]
+            # no point inside (or only nan values)
+            if mx < lo or mn > hi or isnan(mn): continue
+            # all points inside (but nan values)
+            if lo <= mn and mx <= hi:
+                if not k: return i
+                I = flatnonzero(~isnan(Y[i:i+(1 << k)]))
+                return i+I[-1] if Last else i+I[0]
+            # split block (next block on top of the stack)
+            h = 1 << (k-1)
+            if Last: blocks += [(i, k-1), (i+h, k-1)]
+            else:    blocks += [(i+h, k-1), (i, k-1)]
+        return None
@@ -7,14 +7,18 @@
 # todo: rationalise the extra border EB
 # todo: can we estimate the number of ticks and number
 #       decimal digits from the span of the data set
-# todo: Check refresh requirement when dynamic changes (limit, format, ...).
-# todo: Xfit and Yfit give an error when there is no data, fix it.
 
 # wxpython: https://www.wxpython.org/
 import wx
 
 # numpy: https://numpy.org/
-from numpy import exp, inf, where
+from numpy import exp, inf
+
+# python: https://www.python.org/
+from contextlib import contextmanager
+from collections import deque
+from copy import copy
+import threading
 
 # LOCAL
 from theme    import *
@@ -29,6 +33,10 @@ from buttons  import *
 #################################### GRAPH SCREEN #############################
 ###############################################################################
 
+# margin of the on paint plot layers around the plot area (pixels):
+# a layer is only drawn again when a drag goes beyond the margin
+_LAYER_MARGIN = 128
+
 class GraphicScreen(Screen):
 
     def Start(self):
@@ -45,19 +53,44 @@ class GraphicScreen(Screen):
         self.OnPaintGraph.SetYFormat([2, 2])
         self.OnPaintGraph.StyleSet(DRAW_PLOTS | DRAW_LABELS)
         # self.OnPaintGraph.StyleSet(DRAW_LABEL_LEFT | DRAW_LABEL_BOTTOM)
-        # setup screen
-        W, H = self.GetSize()
-        self.buffer   = wx.Bitmap(3*W, 3*H, wx.BITMAP_SCREEN_DEPTH)
+        # setup screen: the screen shows an unbounded canvas made
+        # of tiles which are drawn on demand (see GetTile()). The
+        # tiles keep their RGBA pixels (8 bytes per pixel in total).
+        self.tiles    = TileCache(256, 16<<20, 8)
         self.limit    = xs, xe, ys, ye
-        self.origin   = W, H
-        self.position = W,H
-        # create and setup graph for drawing buffer:
-        # (axis and grid)
+        self.origin   = 0, 0
+        self.position = 0, 0
+        # canvas mapping (ax, bx, ay, by): the canvas pixel of the
+        # coordinate x is ax*x+bx (same for y). The canvas pixel of
+        # a screen pixel is the screen pixel plus the position.
+        self.canvas      = None
+        self.canvasTicks = None
+        # create and setup graph for drawing the tiles:
+        # (axis, grid and buffered plots)
+        T = self.tiles.size
         self.bufferGraph = Graph()
-        self.bufferGraph.SetSize(self.buffer.GetSize())
+        self.bufferGraph.SetSize((T, T))
         self.bufferGraph.SetLimit(xs, xe, ys, ye)
         self.bufferGraph.StyleSet(DRAW_AXIS | DRAW_GRID | DRAW_PLOTS)
         self.bufferGraph.StyleSet(SKIP_BORDERS)
+        # tiles are drawn by a worker thread (see _tileRenderer)
+        self.renderer   = _tileRenderer()
+        self.threaded   = True
+        self.preview    = None # previous tiles (shown until replaced)
+        self.previewDC  = None
+        self.previewMap = None # mapping of the preview (see canvas)
+        # cached layer of each on paint plot (see _drawLayer())
+        self.layers     = {}
+        self.layerGraph = Graph()
+        self.layerGraph.StyleSet(SKIP_BORDERS)
+        # strip chart (see StartStreaming())
+        self.stream      = None
+        self.streamTimer = None
+        # pending changes (see Flush())
+        self.dirty       = False
+        self.dirtyBorder = False
+        self.batch       = 0
+        self.Bind(wx.EVT_IDLE, self._onIdle)
         # set border
         self._setBorder()
         return
@@ -72,10 +105,8 @@ class GraphicScreen(Screen):
 
     def _setBorder(self):
         # get geometry
-        W, H = self.GetSize()
         l, r, t, b = self._minBorder(self.OnPaintGraph)
         # set geometry
-        self.bufferGraph.SetBorder(W+l, W+r, H+t, H+b)
         self.OnPaintGraph.SetBorder(l, r, t, b)
         self.clipArea = l, r, t, b
         # update
@@ -83,30 +114,45 @@ class GraphicScreen(Screen):
         # done
         return
 
+    # maximum memory used by the tiles (bytes)
+    def SetTileBudget(self, Budget):
+        self.tiles.SetBudget(Budget)
+        return
+
+    # draw the tiles with the worker thread (True) or
+    # synchronously with the GUI thread (False)
+    def SetThreadedRendering(self, Value = True):
+        self.threaded = Value
+        return
+
+    # the current limits become the reference limits
+    def _rebase(self):
+        self.limit  = self._getNewLimit()
+        self.origin = self.position
+        return
+
     def SetXLimit(self, Min, Max):
+        self._rebase()
         xs, xe, ys, ye = self.limit
         self.limit = Min, Max, ys, ye
-        # self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate()
         return
 
     def SetYLimit(self, Min, Max):
+        self._rebase()
         xs, xe, ys, ye = self.limit
         self.limit = xs, xe, Min, Max
-        # self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate()
         return
 
     def SetXLabel(self, s):
         self.OnPaintGraph.SetBottomTitle(s)
-        self._setBorder()
-        # self.Refresh()
+        self._invalidate(Border = True)
         return
 
     def SetYLabel(self, s):
         self.OnPaintGraph.SetLeftTitle(s)
-        self._setBorder()
-        # self.Refresh()
+        self._invalidate(Border = True)
         return
 
     def SetXFormat(self, N = None, D = None):
@@ -114,9 +160,7 @@ class GraphicScreen(Screen):
         if N: n = N
         if D: d = D
         self.OnPaintGraph.SetXFormat([n, d])
-        # self._setBorder()
-        self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate()
         return
 
     def SetYFormat(self, N = None, D = None):
@@ -124,25 +168,128 @@ class GraphicScreen(Screen):
         if N: n = N
         if D: d = D
         self.OnPaintGraph.SetYFormat([n, d])
-        self._setBorder()
-        self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate(Border = True)
         return
 
     def SetXTicks(self, n):
         nx, ny = self.OnPaintGraph.ticks
         self.OnPaintGraph.ticks = n, ny
         self.bufferGraph.ticks = n, ny
-        self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate()
         return
 
     def SetYTicks(self, n):
         nx, ny = self.OnPaintGraph.ticks
         self.OnPaintGraph.ticks = nx, n
         self.bufferGraph.ticks = nx, n
-        self.RefreshBuffer()
-        # self.Refresh()
+        self._invalidate()
+        return
+
+    # The setters only record that the graph must be updated: the
+    # update (Flush()) runs once, on the next idle event or before
+    # the next paint, whatever the number of changes.
+    def _invalidate(self, Border = False):
+        self.dirty = True
+        if Border: self.dirtyBorder = True
+        return
+
+    # apply the pending changes and refresh the screen
+    def Flush(self):
+        if self._apply(): self.Refresh()
+        return
+
+    # apply the pending changes (returns True if any)
+    def _apply(self):
+        if not self.dirty: return False
+        self.dirty = False
+        if self.dirtyBorder:
+            self.dirtyBorder = False
+            self._setBorder() # includes RefreshBuffer()
+        else:
+            self.RefreshBuffer()
+        return True
+
+    # group changes: the update runs once, at the end of the block
+    # (for scripts). Example:
+    #   with graph.BatchUpdate():
+    #       graph.SetXLimit(0, 1)
+    #       graph.SetXTicks(5)
+    @contextmanager
+    def BatchUpdate(self):
+        self.batch += 1
+        try:
+            yield self
+        finally:
+            self.batch -= 1
+            if not self.batch: self.Flush()
+        return
+
+    def _onIdle(self, event):
+        if not self.batch: self.Flush()
+        event.Skip()
+        return
+
+    # Strip chart: the x limits follow the last data points over a
+    # window of fixed Width, updated Rate times per second. The data
+    # can be appended at any rate (Append() and Extend(), preferably
+    # with SetMaxLength()). The screen is shifted by whole pixels: the
+    # tiles are kept and only the new strip and the new points are
+    # drawn. With Autoscale, the y limits follow the data in the
+    # window, with a margin (Hysteresis) that avoids a change of the
+    # y limits (and a redraw of all tiles) on every sample.
+    def StartStreaming(self, Width, Rate = 30, Autoscale = True, Hysteresis = 0.1):
+        self.stream = Width, Autoscale, Hysteresis
+        if self.streamTimer is None:
+            self.streamTimer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, self._onStream, self.streamTimer)
+        self.streamTimer.Start(int(1000/Rate))
+        return
+
+    def StopStreaming(self):
+        if self.streamTimer: self.streamTimer.Stop()
+        self.stream = None
+        return
+
+    def _onStream(self, event):
+        if self.stream is None or self.batch: return
+        width, autoscale, hysteresis = self.stream
+        # get last x value
+        plots = self.bufferGraph.plots + self.OnPaintGraph.plots
+        plots = [plot for plot in plots if len(plot.x)]
+        if not plots: return
+        x1 = max(plot.x[-1] if plot.sorted else plot.x.max() for plot in plots)
+        x0 = x1-width
+        # shift the screen (whole pixels)
+        xs, xe, ys, ye = self._getNewLimit()
+        if abs((xe-xs)-width) > 1E-6*width:
+            self.SetXLimit(x0, x1)
+        else:
+            ax = self.OnPaintGraph.scale[0]
+            d = int(round((x1-xe)*ax))
+            if d:
+                x, y = self.position
+                self.position = x+d, y
+        # autoscale
+        if autoscale:
+            Ys, Ye = inf, -inf
+            for plot in plots:
+                span = plot.GetYRange(x0, x1)
+                if span: Ys, Ye = min(Ys, span[0]), max(Ye, span[1])
+            if Ys <= Ye:
+                if Ys == Ye: Ys, Ye = Ys-0.5, Ye+0.5
+                h = hysteresis*(Ye-Ys)
+                # data outside the limits or using too small a part
+                if Ys < ys or Ye > ye or (Ye-Ys) < (ye-ys)/(1+6*hysteresis):
+                    self.SetYLimit(Ys-h, Ye+h)
+        # draw
+        self.UpdateBuffer()
+        return
+
+    # apply the pending changes before painting (see screen.py): the
+    # frame is then drawn again and the whole screen is repainted
+    # (the paint may only cover the tool drawings)
+    def onPrePaint(self):
+        if not self.batch and self._apply(): self.Refresh()
         return
 
     def _minBorder(self, graph):
@@ -174,25 +321,313 @@ class GraphicScreen(Screen):
         xs, xe, ys, ye = xs+dx, xe+dx, ys+dy, ye+dy 
         return xs, xe, ys, ye
 
+    # Set the canvas mapping from the current limits. The tiles are
+    # kept when the mapping has not changed (after a drag for example)
+    # and are discarded otherwise. The buffered plots are brought up to
+    # date when the tiles are drawn (see GetTile()).
     def RefreshBuffer(self):
-        self.limit = self._getNewLimit() # get new limit
-        self.position = self.origin      # reset buffer position
-        dc = wx.MemoryDC()               # setup device context
-        dc.SelectObject(self.buffer)     # select buffer
+        self._rebase()
+        # get canvas mapping
+        xs, xe, ys, ye = self.limit
+        self.OnPaintGraph.SetLimit(xs, xe, ys, ye)
+        ax, bx, ay, by = self.OnPaintGraph.scale
+        X, Y = self.origin
+        canvas = ax, bx+X, ay, by+Y
+        # new canvas
+        ticks = self.bufferGraph.ticks
+        if ticks != self.canvasTicks or not _sameCanvas(canvas, self.canvas):
+            # cancel superseded renderings
+            self.renderer.Cancel()
+            # keep previous tiles image
+            if self.threaded: self._setPreview()
+            self.canvas      = canvas
+            self.canvasTicks = ticks
+            self.bufferGraph.tickLimit = self.limit
+            self.tiles.Clear()
+        return
+
+    # copy the visible tiles into the preview bitmap (before the
+    # canvas mapping changes): new tiles show the preview, scaled
+    # and shifted, until they are drawn (see _drawPreview())
+    def _setPreview(self):
+        if self.canvas is None: return
+        w, h = self.GetSize()
+        if self.preview is None or tuple(self.preview.GetSize()) != (w, h):
+            self.preview   = wx.Bitmap(w, h, wx.BITMAP_SCREEN_DEPTH)
+            self.previewDC = wx.MemoryDC(self.preview)
+        dc = self.previewDC
         dc.SetBackground(wx.Brush(wx.Colour(0,0,0)))
         dc.Clear()
-        xs, xe, ys, ye = self.limit
-        self.bufferGraph.SetLimit(xs, xe, ys, ye)
-        self.bufferGraph.Draw(dc)
-        dc.SelectObject(wx.NullBitmap)   # release device context
+        x, y = self.position
+        T = self.tiles.size
+        for (i, j), tile in self.tiles.Items():
+            dc.Blit(i*T-x, j*T-y, T, T, tile.dc, 0, 0)
+        # preview pixel of the coordinate x is ax*x+bx (same for y)
+        ax, bx, ay, by = self.canvas
+        self.previewMap = ax, bx-x, ay, by-y
+        return
+
+    # draw the preview onto a new tile
+    def _drawPreview(self, tile, i, j):
+        dc = tile.dc
+        dc.SetBackground(wx.Brush(wx.Colour(0,0,0)))
+        dc.Clear()
+        if self.previewMap is None: return
+        ax, bx, ay, by = self.previewMap
+        AX, BX, AY, BY = self.canvas
+        # preview pixels per canvas pixel
+        sx, sy = ax/AX, ay/AY
+        if sx <= 0 or sy <= 0: return
+        # preview area of the tile
+        T = self.tiles.size
+        X, Y = i*T, j*T
+        u0, v0 = (X-BX)*sx+bx, (Y-BY)*sy+by
+        u1, v1 = (X+T-BX)*sx+bx, (Y+T-BY)*sy+by
+        W, H = self.preview.GetSize()
+        U0, V0 = max(u0, 0), max(v0, 0)
+        U1, V1 = min(u1, W), min(v1, H)
+        if U1 <= U0 or V1 <= V0: return
+        # back to tile pixels
+        x0, y0 = (U0-u0)/sx, (V0-v0)/sy
+        x1, y1 = (U1-u0)/sx, (V1-v0)/sy
+        dc.StretchBlit(
+            int(x0), int(y0), int(round(x1-x0)), int(round(y1-y0)),
+            self.previewDC,
+            int(U0), int(V0), int(round(U1-U0)), int(round(V1-V0)))
         return
 
+    # Draw the points appended to the buffered plots: only the new
+    # points are drawn onto the tiles when they are painted.
+    def UpdateBuffer(self):
+        self.RequestRefresh()
+        return
+
+    # The points dropped from a sorted plot are on the left side of
+    # its first point: they were never drawn on a tile whose left edge
+    # is on the right side of the first point (including the marker
+    # size and the line width). Such a tile does not need a redraw.
+    def _droppedOutside(self, graph, plot):
+        if not plot.sorted or not len(plot.x): return False
+        K, ox, oy = plot.kernel
+        X, Y = graph._getPixels(plot.x[0], 0.0)
+        return X+ox+K.shape[1]+plot.pen.GetWidth() < 0
+
+    # get the limits of the tile i, j
+    def _tileLimit(self, i, j):
+        T = self.tiles.size
+        return self._areaLimit(i*T, j*T, T, T)
+
+    # get the limits of the canvas area X, Y, W, H (pixels)
+    def _areaLimit(self, X, Y, W, H):
+        ax, bx, ay, by = self.canvas
+        return (X-bx)/ax, (X+W-1-bx)/ax, (Y+H-1-by)/ay, (Y-by)/ay
+
+    # get the tile at the tile coordinates i, j (see screen.py). The
+    # whole tile is drawn by the worker thread: meanwhile the tile
+    # shows its previous content or the preview. All the tiles
+    # drawings are made on rasters (see raster.py): the whole tile
+    # drawings and the new points drawings look the same.
+    def GetTile(self, i, j):
+        tile = self.tiles.Get((i, j))
+        # tile being drawn
+        if tile.pending: return tile
+        graph = self.bufferGraph
+        # set the graph limits to the tile area
+        xs, xe, ys, ye = self._tileLimit(i, j)
+        graph.SetLimit(xs, xe, ys, ye)
+        # collect new points
+        ranges = None
+        if tile.state is not None:
+            ranges = []
+            for plot in graph.plots:
+                if plot not in tile.state:
+                    ranges = None; break
+                revision, total, dropped = tile.state[plot]
+                if revision != plot.revision:
+                    ranges = None; break
+                if dropped != plot.dropped:
+                    if not self._droppedOutside(graph, plot):
+                        ranges = None; break
+                if plot.total > total:
+                    # index of the last point drawn
+                    k = total-1-plot.dropped
+                    ranges.append((plot, max(k, 0), k >= 0))
+        T = self.tiles.size
+        # draw the whole tile
+        if ranges is None:
+            if self.threaded:
+                if tile.state is None: self._drawPreview(tile, i, j)
+                tile.pending = True
+                self.renderer.Submit(self._tileJob(i, j), self._tileDone)
+                return tile
+            tile.data = graph.Render().data
+        # draw new points (onto the tile pixels)
+        else:
+            raster = RasterDC(T, T, Data = tile.data)
+            for plot, k, connect in ranges:
+                graph.DrawPlot(raster, plot, k, None, connect)
+        tile.dc.DrawBitmap(wx.Bitmap.FromBufferRGBA(T, T, tile.data), 0, 0)
+        # record plots state
+        tile.state = {}
+        for plot in graph.plots:
+            tile.state[plot] = plot.revision, plot.total, plot.dropped
+        return tile
+
+    # Prepare the drawing of the tile i, j by the worker thread: the
+    # graph and the plots are copied (the data arrays are not copied,
+    # the plots only append new points after the existing ones). The
+    # worker only uses the plots pen tuples (no wx object is used).
+    def _tileJob(self, i, j):
+        source = self.bufferGraph
+        graph = Graph()
+        graph.SetSize(source.size)
+        xs, xe, ys, ye = self._tileLimit(i, j)
+        graph.SetLimit(xs, xe, ys, ye)
+        graph.style     = source.style
+        graph.ticks     = source.ticks
+        graph.tickLimit = source.tickLimit
+        state = {}
+        for plot in source.plots:
+            # build the pyramid before copying: the copies share it
+            # (Extend() only updates it past the blocks of the copy)
+            if plot.sorted: plot._getPyramid()
+            graph.plots.append(copy(plot))
+            state[plot] = plot.revision, plot.total, plot.dropped
+        # run by the worker thread
+        def job():
+            try:
+                data = graph.Render().data
+            except Exception as error:
+                print("in 'plot.py',")
+                print(f"failed to draw the tile {i}, {j}: {error}")
+                W, H = graph.size
+                data = RasterDC(W, H).data
+            return (i, j), data, state
+        return job
+
+    # swap in a tile drawn by the worker thread (GUI thread)
+    def _tileDone(self, generation, result):
+        # screen destroyed
+        if not self: return
+        # cancelled
+        if generation != self.renderer.generation: return
+        key, data, state = result
+        tile = self.tiles.Find(key)
+        # tile discarded
+        if tile is None: return
+        T = self.tiles.size
+        tile.dc.DrawBitmap(wx.Bitmap.FromBufferRGBA(T, T, data), 0, 0)
+        tile.data    = data
+        tile.state   = state
+        tile.pending = False
+        self.RequestRefresh()
+        return
+
+    # The screen is composed of layers: the tiles (grid, axis and
+    # buffered plots), the labels and titles, one cached layer for
+    # each on paint plot and the tool drawings. A plot layer is only
+    # drawn again when the canvas mapping or the plot itself have
+    # changed, or when a drag goes beyond its margin (see _drawLayer()).
+    # The labels and titles are copied from their cached bitmaps (see
+    # Graph._getText()): a text is only drawn again when the string or
+    # the font changes (new ticks, formats or titles).
     def onPaint(self, dc):
         xs, xe, ys, ye = self._getNewLimit()
-        self.OnPaintGraph.SetLimit(xs, xe, ys, ye)
-        self.OnPaintGraph.Draw(dc)
+        graph = self.OnPaintGraph
+        graph.SetLimit(xs, xe, ys, ye)
+        style = graph.style
+        # draw labels and titles
+        graph.StyleClear(DRAW_PLOTS)
+        graph.Draw(dc)
+        graph.style = style
+        # draw plots layers
+        if style & DRAW_PLOTS:
+            for plot in graph.plots:
+                self._drawLayer(dc, plot)
+        return
+
+    # The layer of an on paint plot covers the plot area and a margin
+    # around it, in canvas pixels: during a drag, the layer is copied
+    # at the drag offset, until the plot area goes beyond the margin.
+    def _drawLayer(self, dc, plot):
+        W, H = self.GetSize()
+        l, r, t, b = self.clipArea
+        w, h = W-l-r, H-t-b
+        if w <= 0 or h <= 0: return
+        if plot not in self.layers: self.layers[plot] = ScreenLayer()
+        layer = self.layers[plot]
+        M = _LAYER_MARGIN
+        # plot area (canvas pixels)
+        x, y = self.position
+        X, Y = x+l, y+t
+        # the plot area must be inside the layer area
+        if layer.origin is not None:
+            X0, Y0 = layer.origin
+            if not (X0 <= X and X+w <= X0+w+2*M): layer.origin = None
+            if not (Y0 <= Y and Y+h <= Y0+h+2*M): layer.origin = None
+        if layer.origin is None: layer.origin = X-M, Y-M
+        X0, Y0 = layer.origin
+        size = w+2*M, h+2*M
+        key = layer.origin, self.canvas, plot.revision, plot.total
+        def render(gc):
+            graph = self.layerGraph
+            graph.SetSize(size)
+            graph.SetLimit(*self._areaLimit(X0, Y0, *size))
+            graph.DrawPlot(gc, plot)
+            return
+        bitmap = layer.Get(size, key, render)
+        # copy onto the plot area
+        dc.SetClippingRegion(l, t, w, h)
+        dc.DrawBitmap(bitmap, X0-x, Y0-y)
+        dc.DestroyClippingRegion()
         return
 
+# A worker thread running jobs in order. The jobs submitted before
+# Cancel() are dropped. The result of a job is passed to the function
+# done(generation, result), called by the GUI thread. The result must
+# be ignored when generation differs from the current generation.
+class _tileRenderer():
+
+    def __init__(self):
+        self.generation = 0
+        self.jobs       = deque()
+        self.lock       = threading.Condition()
+        self.thread     = threading.Thread(target = self._run, daemon = True)
+        self.thread.start()
+        return
+
+    def Submit(self, job, done):
+        with self.lock:
+            self.jobs.append((self.generation, job, done))
+            self.lock.notify()
+        return
+
+    def Cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.jobs.clear()
+        return
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.jobs: self.lock.wait()
+                generation, job, done = self.jobs.popleft()
+            result = job()
+            wx.CallAfter(done, generation, result)
+        return
+
+# compare two canvas mappings (up to rounding errors)
+def _sameCanvas(A, B):
+    if A is None or B is None: return False
+    ax, bx, ay, by = A
+    AX, BX, AY, BY = B
+    if abs(ax-AX) > 1E-9*abs(ax): return False
+    if abs(ay-AY) > 1E-9*abs(ay): return False
+    if abs(bx-BX) > 1E-3: return False
+    if abs(by-BY) > 1E-3: return False
+    return True
+
 ###############################################################################
 ################################ INTERACTIVE GRAPH ############################
 ###############################################################################
@@ -260,6 +695,20 @@ class InteractiveGraph(Control):
         # done
         return
 
+    # strip chart mode (see GraphicScreen)
+    def StartStreaming(self, Width, Rate = 30, Autoscale = True, Hysteresis = 0.1):
+        self.Graph.StartStreaming(Width, Rate, Autoscale, Hysteresis)
+        return
+
+    def StopStreaming(self):
+        self.Graph.StopStreaming()
+        return
+
+    # snap the measure tool to the nearest data point
+    def SetMeasureSnap(self, Value = True, Radius = 10):
+        self.MeasureTool.SetSnap(Value, Radius)
+        return
+
     def MeasureEvent(self, event):
         if event.status == 1: self.Graph.ToolSelect(self.MeasureTool)
         if event.status == 0: self.MeasureTool.Deselect()
@@ -292,8 +741,7 @@ class InteractiveGraph(Control):
         xs, xe, ys, ye = cx-sx/2, cx+sx/2, cy-sy/2, cy+sy/2
         self.Graph.SetXLimit(xs, xe)
         self.Graph.SetYLimit(ys, ye)
-        self.Graph.RefreshBuffer()
-        self.Graph.Refresh()
+        self.Graph.Flush()
         return
 
     def YfitEvent(self, event):
@@ -303,60 +751,42 @@ class InteractiveGraph(Control):
             # set start limits
             Ys, Ye = inf, -inf
             # for each data sets:
-            plots = self.Graph.bufferGraph.plots
-            for plot in plots:
-                # restrict data set
-                I = (plot.x >= xs) & (plot.x <= xe)
-                y = plot.y[where(I)]
-                if len(y):
-                    # get data span
-                    ys, ye = min(y), max(y)
-                    # get overall extrema
-                    Ys, Ye = min(Ys, ys), max(Ye, ye)
-            plots = self.Graph.OnPaintGraph.plots
+            plots = self.Graph.bufferGraph.plots + self.Graph.OnPaintGraph.plots
             for plot in plots:
-                # restrict data set
-                I = (plot.x >= xs) & (plot.x <= xe)
-                y = plot.y[where(I)]
-                if len(y):
-                    # get data span
-                    ys, ye = min(y), max(y)
+                # get data span (restricted data set)
+                span = plot.GetYRange(xs, xe)
+                if span:
                     # get overall extrema
-                    Ys, Ye = min(Ys, ys), max(Ye, ye)
+                    Ys, Ye = min(Ys, span[0]), max(Ye, span[1])
+            # no data
+            if Ys > Ye: return
+            # single value
+            if Ys == Ye: Ys, Ye = Ys-0.5, Ye+0.5
             # leave thin border surounding data
             X = 1.11 # (11 percent each side)
             sy, cy = X*(Ye-Ys), 0.5*(Ys+Ye)
             ys, ye = cy-sy/2, cy+sy/2
             # update limits
             self.Graph.SetYLimit(ys, ye)
-            self.Graph.RefreshBuffer()
-            self.Graph.Refresh()
+            self.Graph.Flush()
         return
 
     def XfitEvent(self, event):
         if event.status:
             xs, xe, ys, ye = self.Graph.limit
             Xs, Xe = inf, -inf
-            plots = self.Graph.bufferGraph.plots
+            plots = self.Graph.bufferGraph.plots + self.Graph.OnPaintGraph.plots
             for plot in plots:
-                I = (plot.y >= ys) & (plot.y <= ye)
-                x = plot.x[where(I)]
-                if len(x):
-                    xs, xe = min(x), max(x)
-                    Xs, Xe = min(Xs, xs), max(Xe, xe)
-            plots = self.Graph.OnPaintGraph.plots
-            for plot in plots:
-                I = (plot.y >= ys) & (plot.y <= ye)
-                x = plot.x[where(I)]
-                if len(x):
-                    xs, xe = min(x), max(x)
-                    Xs, Xe = min(Xs, xs), max(Xe, xe)
+                span = plot.GetXRange(ys, ye)
+                if span:
+                    Xs, Xe = min(Xs, span[0]), max(Xe, span[1])
+            if Xs > Xe: return
+            if Xs == Xe: Xs, Xe = Xs-0.5, Xe+0.5
             X = 1.11
             sx, cx = X*(Xe-Xs), 0.5*(Xs+Xe)
             xs, xe = cx-sx/2, cx+sx/2
             self.Graph.SetXLimit(xs, xe)
-            self.Graph.RefreshBuffer()
-            self.Graph.Refresh()
+            self.Graph.Flush()
         return
 
 ###############################################################################
@@ -407,10 +837,19 @@ class _Expand(ScreenTool):
         self.stop  = self.start
         return
 
+    # rectangle enclosing the tool drawings
+    def _band(self):
+        X, Y = self.start
+        x, y = self.stop
+        x1, x2 = min(X, x), max(X, x)
+        y1, y2 = min(Y, y), max(Y, y)
+        return wx.Rect(x1-2, y1-2, x2-x1+5, y2-y1+5)
+
     def _Motion(self, event):
         if self.lock:
+            band = self._band()
             self.stop = event.GetPosition()
-            self.scr.Refresh()
+            self.scr.RequestRefresh(True, [band.Union(self._band())])
         return
 
     def _LeftUp(self, event):
@@ -429,8 +868,9 @@ class _Expand(ScreenTool):
                 self.scr.SetXLimit(xs, xe)
                 self.scr.SetYLimit(ys, ye)
             self.lock = False
-            self.scr.RefreshBuffer()
-            self.scr.Refresh()
+            # apply the new limits (if any) and remove the band
+            self.scr.Flush()
+            self.scr.RefreshOverlay()
         # done   
         return
 
@@ -438,7 +878,7 @@ class _Expand(ScreenTool):
     def _Leave(self, event):
         if self.lock:
             self.lock = False
-            self.scr.Refresh()        
+            self.scr.RefreshOverlay()
         return
 
 ###############################################################################
@@ -481,10 +921,19 @@ class _XExpand(ScreenTool):
         self.stop  = self.start
         return
 
+    # rectangle enclosing the tool drawings
+    def _band(self):
+        W, H = self.scr.GetSize()
+        X, Y = self.start
+        x, y = self.stop
+        x1, x2 = min(X, x), max(X, x)
+        return wx.Rect(x1-2, 0, x2-x1+5, H)
+
     def _Motion(self, event):
         if self.lock:
+            band = self._band()
             self.stop = event.GetPosition()
-            self.scr.Refresh()
+            self.scr.RequestRefresh(True, [band.Union(self._band())])
         return
 
     def _LeftUp(self, event):
@@ -502,8 +951,9 @@ class _XExpand(ScreenTool):
                 # update data scale
                 self.scr.SetXLimit(xs, xe)
             self.lock = False
-            self.scr.RefreshBuffer()
-            self.scr.Refresh()
+            # apply the new limits (if any) and remove the band
+            self.scr.Flush()
+            self.scr.RefreshOverlay()
         # done   
         return
 
@@ -511,7 +961,7 @@ class _XExpand(ScreenTool):
     def _Leave(self, event):
         if self.lock:
             self.lock = False
-            self.scr.Refresh()        
+            self.scr.RefreshOverlay()
         return
 
 ###############################################################################
@@ -554,10 +1004,19 @@ class _YExpand(ScreenTool):
         self.stop  = self.start
         return
 
+    # rectangle enclosing the tool drawings
+    def _band(self):
+        W, H = self.scr.GetSize()
+        X, Y = self.start
+        x, y = self.stop
+        y1, y2 = min(Y, y), max(Y, y)
+        return wx.Rect(0, y1-2, W, y2-y1+5)
+
     def _Motion(self, event):
         if self.lock:
+            band = self._band()
             self.stop = event.GetPosition()
-            self.scr.Refresh()
+            self.scr.RequestRefresh(True, [band.Union(self._band())])
         return
 
     def _LeftUp(self, event):
@@ -575,8 +1034,9 @@ class _YExpand(ScreenTool):
                 # update data scale
                 self.scr.SetYLimit(ys, ye)
             self.lock = False
-            self.scr.RefreshBuffer()
-            self.scr.Refresh()
+            # apply the new limits (if any) and remove the band
+            self.scr.Flush()
+            self.scr.RefreshOverlay()
         # done   
         return
 
@@ -584,7 +1044,7 @@ class _YExpand(ScreenTool):
     def _Leave(self, event):
         if self.lock:
             self.lock = False
-            self.scr.Refresh()        
+            self.scr.RefreshOverlay()
         return
 
 ###############################################################################
@@ -595,8 +1055,13 @@ class _Measure(ScreenTool):
     def Start(self):
         # LOCAL
         self.lock = False
-        self.P0 = None
-        self.P1 = None
+        self.P0, self.V0 = None, None # pixel position and value
+        self.P1, self.V1 = None, None
+        # last cursor position (resolved once per frame, see onPaint())
+        self.motion, self.pending = None, False
+        # snap to the nearest data point (within radius pixels)
+        self.snap   = False
+        self.radius = 10
         # style
         self.colour = wx.Colour(155,155,100) # adjust color
         self.pen = wx.Pen(self.colour, 1, wx.PENSTYLE_DOT_DASH)
@@ -604,6 +1069,8 @@ class _Measure(ScreenTool):
         return
 
     def onPaint(self, dc):
+        # resolve the last cursor motion
+        if self.pending: self._resolve()
         # get refernce to graph
         Graph = self.scr.OnPaintGraph
         # get geometry
@@ -632,8 +1099,7 @@ class _Measure(ScreenTool):
         wX, wY = 0, 0
         # write P0
         if self.P0:
-            x0, y0 = self.P0
-            X0, Y0 = self.scr.OnPaintGraph._getCoords(x0, y0)
+            X0, Y0 = self.V0
             X, Y = l, t
             T = "X0 = " + fx % X0
             wX, h = dc.GetTextExtent(T)
@@ -646,8 +1112,7 @@ class _Measure(ScreenTool):
             dc.DrawText(T, X, Y)
         # draw P1
         if self.P1:
-            x1, y1 = self.P1
-            X1, Y1 = self.scr.OnPaintGraph._getCoords(x1, y1)
+            X1, Y1 = self.V1
             X, Y = X + max(wX, wY)+5, t
             T = "X1 = " + fx % X1
             wX, h = dc.GetTextExtent(T)
@@ -686,19 +1151,54 @@ class _Measure(ScreenTool):
         # done
         return position
 
+    # snap to the nearest data point of the plots of both graphs
+    def SetSnap(self, Value = True, Radius = 10):
+        self.snap, self.radius = Value, Radius
+        return
+
+    # get the pixel position and the value of the cursor at the
+    # position P (or of the nearest data point in snap mode)
+    def _getPoint(self, P):
+        if P is None: return None, None
+        Graph = self.scr.OnPaintGraph
+        V = Graph._getCoords(*P)
+        if self.snap:
+            x, y = V
+            ax, bx, ay, by = Graph.scale
+            plots = self.scr.bufferGraph.plots + Graph.plots
+            D = inf
+            for plot in plots:
+                found = plot.Nearest(x, y, ax, ay, self.radius)
+                if found and found[1] < D:
+                    i, D = found
+                    V = plot.x[i], plot.y[i]
+            if D < inf:
+                X, Y = Graph._getPixels(*V)
+                P = int(round(X)), int(round(Y))
+        return P, V
+
     def _LeftDown(self, event):
-        self.lock  = True
-        self.P0 = self._getPosition(event) 
-        self.P1 = self.P0
+        self.lock, self.pending = True, False
+        self.P0, self.V0 = self._getPoint(self._getPosition(event))
+        self.P1, self.V1 = self.P0, self.V0
         return
 
+    # the motion events can come much faster than the frames:
+    # only the last position is kept and resolved in onPaint()
     def _Motion(self, event):
+        self.motion, self.pending = self._getPosition(event), True
+        self.scr.RequestRefresh(True)
+        return
+
+    def _resolve(self):
+        self.pending = False
         # get position
-        P = self._getPosition(event)
+        P, V = self._getPoint(self.motion)
         # update measured value
-        if self.lock: self.P0, self.P1 = self.P0, P
-        else:         self.P0, self.P1 = P, None
-        self.scr.Refresh()
+        if self.lock: self.P1, self.V1 = P, V
+        else:
+            self.P0, self.V0 = P, V
+            self.P1, self.V1 = None, None
         return
 
     def _LeftUp(self, event):
@@ -711,8 +1211,8 @@ class _Measure(ScreenTool):
 
     def _unlock(self, event):
         if self.lock:
-            self.lock  = False
-            self.P0 = self._getPosition(event)
-            self.P1 = None
-            self.scr.Refresh()
+            self.lock, self.pending = False, False
+            self.P0, self.V0 = self._getPoint(self._getPosition(event))
+            self.P1, self.V1 = None, None
+            self.scr.RefreshOverlay()
         return
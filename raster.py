@@ -0,0 +1,216 @@
+# 'raster.py'
+# content; numpy RGBA drawing target for graphs.
+# author; Roch schanen
+# created; 2026 October 18
+# repository; https://github.com/RochSchanen/rochpygui
+
+# todo: text is not rendered (labels and titles are skipped)
+# todo: lines are drawn with square pen ends and without anti-aliasing
+
+# wxpython: https://www.wxpython.org/
+import wx
+
+# numpy: https://numpy.org/
+from numpy import zeros, ones, uint8, uint16, rint, arange, repeat, cumsum
+from numpy import minimum, maximum, where, errstate, array, frombuffer
+from numpy import isfinite
+
+###############################################################################
+################################### RASTER ####################################
+###############################################################################
+
+# dashes patterns (pixels on, pixels off, ...)
+_DASHES = {
+    wx.PENSTYLE_DOT        : [1, 2],
+    wx.PENSTYLE_SHORT_DASH : [4, 4],
+    wx.PENSTYLE_LONG_DASH  : [8, 4],
+    wx.PENSTYLE_DOT_DASH   : [6, 3, 1, 3]}
+
+# A drawing target with the subset of the device context methods used by
+# the Graph class. The drawings are made into a numpy RGBA array: no display
+# is required. The array is converted into a bitmap in one call by GetBitmap().
+# When Data (an RGBA array of shape Height, Width, 4) is given, the drawings
+# are added to it (it is not cleared). No wx object is created: a raster can
+# be drawn by a worker thread, provided the pens are given as PenSpec() tuples.
+class RasterDC():
+
+    def __init__(self, Width, Height, Colour = (0, 0, 0, 255), Data = None):
+        # PARAMETERS
+        self.size = Width, Height
+        # LOCAL
+        self.data   = Data
+        self.clip   = 0, 0, Width, Height
+        self.colour = None # (r, g, b, a), None when transparent
+        self.width  = 1
+        self.dashes = None # pattern of visible pixels
+        # clear
+        if Data is None:
+            self.data = zeros((Height, Width, 4), uint8)
+            self.data[:, :] = Colour
+        # done
+        return
+
+    # pen is a wx.Pen or a PenSpec() tuple
+    def SetPen(self, pen):
+        if isinstance(pen, wx.Pen): pen = PenSpec(pen)
+        colour, width, style = pen
+        # get colour
+        self.colour = tuple(colour)
+        if style == wx.PENSTYLE_TRANSPARENT: self.colour = None
+        # get width
+        self.width = max(int(width), 1)
+        # get dashes
+        self.dashes = None
+        if style in _DASHES:
+            pattern = []
+            for n, d in enumerate(_DASHES[style]):
+                pattern += [n%2 == 0]*d*self.width
+            self.dashes = array(pattern)
+        return
+
+    # only transparent brushes are used by the graphs
+    def SetBrush(self, brush):
+        pass
+
+    def SetClippingRegion(self, x, y, w, h):
+        W, H = self.size
+        xs, ys = max(int(x), 0), max(int(y), 0)
+        xe, ye = min(int(x+w), W), min(int(y+h), H)
+        self.clip = xs, ys, max(xe-xs, 0), max(ye-ys, 0)
+        return
+
+    def DestroyClippingRegion(self):
+        W, H = self.size
+        self.clip = 0, 0, W, H
+        return
+
+    def DrawPoint(self, x, y):
+        self._drawPixels(rint([x]).astype(int), rint([y]).astype(int))
+        return
+
+    def DrawLine(self, x1, y1, x2, y2):
+        self._drawSegments(
+            array([x1], float), array([y1], float),
+            array([x2], float), array([y2], float))
+        return
+
+    # points is a list of (x, y) pairs or an array of shape (n, 2)
+    def DrawLines(self, points):
+        P = array(points, float).reshape(-1, 2)
+        if len(P) < 2: return
+        self._drawSegments(P[:-1, 0], P[:-1, 1], P[1:, 0], P[1:, 1])
+        return
+
+    # outline only (see SetBrush)
+    def DrawRectangle(self, x, y, w, h):
+        X = array([x, x+w-1, x+w-1, x, x], float)
+        Y = array([y, y, y+h-1, y+h-1, y], float)
+        self._drawSegments(X[:-1], Y[:-1], X[1:], Y[1:])
+        return
+
+    def DrawBitmap(self, bitmap, x, y):
+        self.DrawRaster(BitmapToRGBA(bitmap), int(x), int(y))
+        return
+
+    # blend an RGBA array R at the position x, y
+    def DrawRaster(self, R, x, y):
+        h, w = R.shape[:2]
+        # intersect with clip area
+        cx, cy, cw, ch = self.clip
+        xs, xe = max(x, cx), min(x+w, cx+cw)
+        ys, ye = max(y, cy), min(y+h, cy+ch)
+        if xe <= xs or ye <= ys: return
+        # blend
+        S = R[ys-y:ye-y, xs-x:xe-x].astype(uint16)
+        D = self.data[ys:ye, xs:xe]
+        a = S[:, :, 3:]
+        D[:, :, :3] = (S[:, :, :3]*a + D[:, :, :3]*(255-a))//255
+        D[:, :, 3:] = a + D[:, :, 3:]*(255-a)//255
+        return
+
+    # convert to bitmap (single copy)
+    def GetBitmap(self):
+        W, H = self.size
+        return wx.Bitmap.FromBufferRGBA(W, H, self.data)
+
+    # export to an image file (type from extension)
+    def SaveFile(self, path):
+        W, H = self.size
+        rgb   = self.data[:, :, :3].tobytes()
+        alpha = self.data[:, :,  3].tobytes()
+        image = wx.Image(W, H, rgb, alpha)
+        return image.SaveFile(path)
+
+    # draw the segments (X0, Y0)-(X1, Y1) (arrays of same size)
+    def _drawSegments(self, X0, Y0, X1, Y1):
+        if self.colour is None: return
+        # drop the segments with a missing end (nan or inf)
+        V = isfinite(X0) & isfinite(Y0) & isfinite(X1) & isfinite(Y1)
+        X0, Y0, X1, Y1 = X0[V], Y0[V], X1[V], Y1[V]
+        # clip segments (Liang-Barsky)
+        cx, cy, cw, ch = self.clip
+        DX, DY = X1-X0, Y1-Y0
+        T0, T1 = zeros(len(X0)), ones(len(X0))
+        V = ones(len(X0), bool)
+        for P, Q in [
+            (-DX, X0-(cx-0.5)), (DX, (cx+cw-0.5)-X0),
+            (-DY, Y0-(cy-0.5)), (DY, (cy+ch-0.5)-Y0)]:
+            Z = (P == 0)
+            V &= ~(Z & (Q < 0))
+            with errstate(divide = 'ignore', invalid = 'ignore'):
+                R = Q/where(Z, 1.0, P)
+            T0 = where(~Z & (P < 0), maximum(T0, R), T0)
+            T1 = where(~Z & (P > 0), minimum(T1, R), T1)
+        V &= (T0 <= T1)
+        X0, Y0, X1, Y1 = X0+T0*DX, Y0+T0*DY, X0+T1*DX, Y0+T1*DY
+        X0, Y0, X1, Y1 = rint(X0[V]), rint(Y0[V]), rint(X1[V]), rint(Y1[V])
+        if not len(X0): return
+        # number of pixels per segment
+        N = maximum(abs(X1-X0), abs(Y1-Y0)).astype(int)+1
+        # segment index and position of each pixel
+        S = repeat(arange(len(N)), N)
+        K = arange(N.sum())-repeat(cumsum(N)-N, N)
+        F = K/maximum(N-1, 1)[S]
+        X = rint(X0[S]+F*(X1-X0)[S]).astype(int)
+        Y = rint(Y0[S]+F*(Y1-Y0)[S]).astype(int)
+        # apply dashes
+        if self.dashes is not None:
+            I = self.dashes[arange(len(X)) % len(self.dashes)]
+            X, Y = X[I], Y[I]
+        # draw
+        self._drawPixels(X, Y)
+        return
+
+    # draw square pen dots at the pixels (X, Y)
+    def _drawPixels(self, X, Y):
+        if self.colour is None: return
+        cx, cy, cw, ch = self.clip
+        r, g, b, a = self.colour
+        w = self.width
+        for dx in range(-(w//2), w-w//2):
+            for dy in range(-(w//2), w-w//2):
+                x, y = X+dx, Y+dy
+                V = (x >= cx) & (x < cx+cw) & (y >= cy) & (y < cy+ch)
+                x, y = x[V], y[V]
+                if a == 255:
+                    self.data[y, x] = r, g, b, a
+                else:
+                    D = self.data[y, x].astype(uint16)
+                    D[:, :3] = (array([r, g, b])*a + D[:, :3]*(255-a))//255
+                    D[:,  3] = a + D[:, 3]*(255-a)//255
+                    self.data[y, x] = D
+        return
+
+# get the RGBA values of a bitmap as a numpy array
+def BitmapToRGBA(bitmap):
+    image = bitmap.ConvertToImage()
+    if not image.HasAlpha(): image.InitAlpha()
+    w, h = image.GetSize()
+    R = zeros((h, w, 4), uint8)
+    R[:, :, :3] = frombuffer(image.GetData(),  uint8).reshape(h, w, 3)
+    R[:, :,  3] = frombuffer(image.GetAlpha(), uint8).reshape(h, w)
+    return R
+
+# get the pen parameters as a tuple ((r, g, b, a), width, style)
+def PenSpec(pen):
+    return pen.GetColour().Get(True), pen.GetWidth(), pen.GetStyle()
@@ -4,14 +4,16 @@
 # created; 2020 April 11
 # repository; https://github.com/RochSchanen/rochpygui
 
-# todo: in onPaint() should we clear selectively the screen to redraw less ?
-
 # wxpython: https://www.wxpython.org/
 import wx
 
 # numpy: https://numpy.org/
 from numpy import exp, log10, floor, ceil, linspace
 
+# python: https://www.python.org/
+from collections import OrderedDict
+import time
+
 # LOCAL
 from theme import *
 
@@ -37,8 +39,18 @@ class Screen(wx.Control):
         # LOCAL
         self.tool       = None
         self.buffer     = None
+        self.bufferDC   = None # device context holding the buffer
+        self.frame      = None # screen image without the tool drawings
+        self.frameDC    = None # device context holding the frame
+        self.frameValid = False
+        self.tiles      = None # TileCache (replaces the buffer)
         self.position   = 0, 0
         self.clipArea   = 0, 0, 0, 0
+        # frame rate cap (see RequestRefresh())
+        self.fps          = 60
+        self.request      = None # pending request (Overlay, Rects)
+        self.lastFrame    = 0.0  # time of the last request issued
+        self.framesMerged = 0    # number of requests merged
         # set geometry
         self.SetSize((Width, Height))
         # call user-defined constructor     
@@ -54,41 +66,143 @@ class Screen(wx.Control):
         # no operation (reduced flicker)
         pass
 
-    # Called by the OS or by a user Refresh():
+    # Called by the OS or by a user Refresh(). The screen image
+    # without the tool drawings (the frame) is kept in a bitmap: it
+    # is drawn again only after a Refresh(). Then, only the damaged
+    # rectangles (update region) are copied from the frame, and the
+    # tool drawings are added on top (see RefreshOverlay()).
     def _onPaint(self, event):
+        # user defined preparation
+        self.onPrePaint()
         # create device context
         # for the _onPaint() method
         dc = wx.BufferedPaintDC(self)
-        # clear
-        dc.SetBackground(wx.Brush(BackgroundColour))
-        dc.Clear() # clear everything for the moment
-        # draw
-        if self.buffer:
-            # get clip geometry
-            l, r, t, b = self.clipArea
-            x, y = self.position
-            w, h = self.GetSize()
-            W, H = self.buffer.GetSize()
-            # get clip image
-            X, Y, P, Q = x+l, y+t, w-l-r, h-t-b
-            # bitmap partially or fully uncovered
-            if X < 0: P += X; X = 0; l = -x
-            if Y < 0: Q += Y; Y = 0; t = -y
-            if (X+P) > W: P = W-X
-            if (Y+Q) > H: Q = H-Y
-            # bitmap partially covered
-            if P>0 and Q>0:
-                r = wx.Rect(X, Y, P, Q)
-                clip = self.buffer.GetSubBitmap(r)
-                dc.DrawBitmap(clip, l, t)
-        # more drawings
-        self.onPaint(dc)
+        # draw frame
+        if not self.frameValid: self._drawFrame()
+        # copy damaged rectangles
+        iterator = wx.RegionIterator(self.GetUpdateRegion())
+        while iterator.HaveRects():
+            x, y, w, h = iterator.GetRect()
+            dc.Blit(x, y, w, h, self.frameDC, x, y)
+            iterator.Next()
         # additional painting features from the selected tool
         if self.tool: self.tool.onPaint(dc)
         # It is not required to release the DC object
         # when BufferedPaintDC() is used within onPaint()
         return
 
+    # draw everything but the tool drawings into the frame bitmap
+    def _drawFrame(self):
+        w, h = self.GetSize()
+        # the frame stays selected into a memory device context
+        if self.frame is None or tuple(self.frame.GetSize()) != (w, h):
+            self.frame   = wx.Bitmap(w, h, wx.BITMAP_SCREEN_DEPTH)
+            self.frameDC = wx.MemoryDC(self.frame)
+        dc = self.frameDC
+        # clear
+        dc.SetBackground(wx.Brush(BackgroundColour))
+        dc.Clear()
+        # copy buffer and tiles into the plot area
+        l, r, t, b = self.clipArea
+        rect = wx.Rect(l, t, w-l-r, h-t-b)
+        if not rect.IsEmpty():
+            if self.buffer: self._blitBuffer(dc, rect)
+            if self.tiles:  self._blitTiles(dc, rect)
+        # more drawings
+        self.onPaint(dc)
+        # done
+        self.frameValid = True
+        return
+
+    # the frame must be drawn again
+    def Refresh(self, eraseBackground = True, rect = None):
+        self.frameValid = False
+        wx.Control.Refresh(self, eraseBackground, rect)
+        return
+
+    # Only the tool drawings have changed: the frame is copied back
+    # onto the screen (restoring the pixels under the previous tool
+    # drawings) and the tool draws again. Rects is an optional list
+    # of rectangles enclosing the old and new tool drawings.
+    def RefreshOverlay(self, Rects = None):
+        if Rects is None:
+            wx.Control.Refresh(self, False)
+        else:
+            for rect in Rects:
+                wx.Control.Refresh(self, False, rect)
+        return
+
+    # Request a Refresh() (or a RefreshOverlay() when Overlay is set)
+    # at most once per frame: the requests received before the next
+    # frame are merged into one (counted by framesMerged). This is
+    # used by the tools on mouse motion and by the asynchronous
+    # updates, which can be much more frequent than the screen frames.
+    def RequestRefresh(self, Overlay = False, Rects = None):
+        # merge with pending request
+        if self.request:
+            overlay, rects = self.request
+            Overlay = Overlay and overlay
+            if Rects is None or rects is None: Rects = None
+            else: Rects = rects + Rects
+            self.request = Overlay, Rects
+            self.framesMerged += 1
+            return
+        self.request = Overlay, Rects
+        # delay until the next frame
+        delay = self.lastFrame + 1.0/self.fps - time.monotonic()
+        if delay > 0: wx.CallLater(int(1000*delay)+1, self._issueRequest)
+        else:         self._issueRequest()
+        return
+
+    def _issueRequest(self):
+        # screen destroyed
+        if not self: return
+        if self.request is None: return
+        overlay, rects = self.request
+        self.request = None
+        self.lastFrame = time.monotonic()
+        if overlay: self.RefreshOverlay(rects)
+        else:       self.Refresh()
+        return
+
+    # maximum number of frames per second (see RequestRefresh())
+    def SetFrameRate(self, fps):
+        self.fps = fps
+        return
+
+    # copy the buffer onto the screen rectangle rect (the buffer
+    # pixel of the screen pixel u, v is u+x, v+y, see position)
+    def _blitBuffer(self, dc, rect):
+        x, y = self.position
+        W, H = self.buffer.GetSize()
+        # source area (partially or fully uncovered)
+        X0, Y0 = max(rect.x+x, 0), max(rect.y+y, 0)
+        X1, Y1 = min(rect.x+rect.width+x, W), min(rect.y+rect.height+y, H)
+        if X1 <= X0 or Y1 <= Y0: return
+        # the buffer stays selected into a memory device context
+        if self.bufferDC is None or self.bufferDC.bitmap is not self.buffer:
+            self.bufferDC = wx.MemoryDC(self.buffer)
+            self.bufferDC.bitmap = self.buffer
+        dc.Blit(X0-x, Y0-y, X1-X0, Y1-Y0, self.bufferDC, X0, Y0)
+        return
+
+    # copy the tiles onto the screen rectangle rect
+    def _blitTiles(self, dc, rect):
+        x, y = self.position
+        T = self.tiles.size
+        # damaged canvas area
+        X0, Y0 = rect.x+x, rect.y+y
+        X1, Y1 = X0+rect.width, Y0+rect.height
+        for j in range(Y0//T, (Y1-1)//T+1):
+            for i in range(X0//T, (X1-1)//T+1):
+                tile = self.GetTile(i, j)
+                if tile is None: continue
+                # intersection of tile and damaged area
+                xs, ys = max(X0, i*T), max(Y0, j*T)
+                xe, ye = min(X1, i*T+T), min(Y1, j*T+T)
+                dc.Blit(xs-x, ys-y, xe-xs, ye-ys, tile.dc, xs-i*T, ys-j*T)
+        return
+
     # select tool (Drag, Select, Draw, etc...)
     def ToolSelect(self, newTool):
         if self.tool: self.tool.Deselect()
@@ -101,10 +215,127 @@ class Screen(wx.Control):
     def Start(self):
         pass
 
+    # called before painting (for example to apply pending changes)
+    def onPrePaint(self):
+        pass
+
     # additional onPaint features (such as borders, ticks, etc...)
     def onPaint(self, dc):
         pass
 
+    # user defined tile (ScreenTile) at the tile coordinates i, j (the
+    # tile covers the canvas pixels i*T to i*T+T-1, j*T to j*T+T-1)
+    def GetTile(self, i, j):
+        return None
+
+###############################################################################
+#################################### LAYERS ###################################
+###############################################################################
+
+# A cached transparent bitmap. The layer is drawn again only
+# when its key (any comparable value) changes (see Get()).
+class ScreenLayer():
+
+    def __init__(self):
+        self.key    = None
+        self.bitmap = None
+        self.blank  = None # transparent pixels (to clear the bitmap)
+        self.origin = None # user defined (position of the layer)
+        return
+
+    # get the layer bitmap: when Key is not the key of the cached
+    # bitmap, the bitmap (of size Size) is cleared to transparent
+    # and Render(dc) is called to draw the layer. The bitmap is
+    # only created again when the size changes.
+    def Get(self, Size, Key, Render):
+        W, H = Size
+        if self.bitmap is None or (Key, (W, H)) != self.key:
+            if self.bitmap is None or tuple(self.bitmap.GetSize()) != (W, H):
+                self.bitmap = wx.Bitmap.FromRGBA(W, H, 0, 0, 0, 0)
+                self.blank  = bytes(W*H*4)
+            else:
+                self.bitmap.CopyFromBuffer(self.blank, wx.BitmapBufferFormat_RGBA)
+            dc = wx.MemoryDC(self.bitmap)
+            gc = wx.GCDC(dc) # alpha aware device context
+            Render(gc)
+            del gc
+            dc.SelectObject(wx.NullBitmap)
+            self.key = Key, (W, H)
+        return self.bitmap
+
+    # force the next Get() to draw the layer
+    def Invalidate(self):
+        self.key = None
+        return
+
+###############################################################################
+#################################### TILES ####################################
+###############################################################################
+
+# A square bitmap of the canvas. The bitmap stays selected into
+# its memory device context: use dc to draw onto the tile.
+class ScreenTile():
+
+    def __init__(self, Size):
+        self.bitmap = wx.Bitmap(Size, Size, wx.BITMAP_SCREEN_DEPTH)
+        self.dc      = wx.MemoryDC(self.bitmap)
+        self.state   = None  # user defined (None when not drawn)
+        self.pending = False # user defined (being drawn)
+        self.data    = None  # user defined (pixels, see TileCache)
+        return
+
+# The tiles of an unbounded canvas. The tiles are created on demand
+# and the least recently used tiles are discarded when the memory
+# used exceeds the budget (in bytes). Depth is the number of bytes
+# per tile pixel (4 for the bitmap, plus the user data if any).
+class TileCache():
+
+    def __init__(self, Size = 256, Budget = 8<<20, Depth = 4):
+        # PARAMETERS
+        self.size   = Size
+        self.budget = Budget
+        self.depth  = Depth
+        # LOCAL
+        self.tiles = OrderedDict()
+        return
+
+    # get the tile at key (a new tile has the state None)
+    def Get(self, key):
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        tile = ScreenTile(self.size)
+        self.tiles[key] = tile
+        self._evict()
+        return tile
+
+    # get the tile at key if it exists (None otherwise)
+    def Find(self, key):
+        return self.tiles.get(key)
+
+    # list of (key, tile) pairs
+    def Items(self):
+        return list(self.tiles.items())
+
+    def Clear(self):
+        self.tiles.clear()
+        return
+
+    def SetBudget(self, Budget):
+        self.budget = Budget
+        self._evict()
+        return
+
+    # memory used by the tiles (bytes)
+    def GetMemory(self):
+        return len(self.tiles)*self.size*self.size*self.depth
+
+    def _evict(self):
+        n = max(self.budget//(self.size*self.size*self.depth), 1)
+        while len(self.tiles) > n:
+            self.tiles.popitem(last = False)
+        return
+
 ###############################################################################
 #################################### TOOLS ####################################
 ###############################################################################
@@ -175,8 +406,8 @@ class ScreenDragBuffer(ScreenTool):
             P, Q = p+X-x, q+Y-y
             # set postition
             self.scr.position = P, Q
-            # invoque the _onPaint method
-            self.scr.Refresh()
+            # invoque the _onPaint method (next frame)
+            self.scr.RequestRefresh()
         return
 
     def _LeftUp(self, event):
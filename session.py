@@ -0,0 +1,110 @@
+# 'session.py'
+# content; asyncio instrument sessions.
+# author; Roch schanen
+# created; 2026 October 18
+# repository; https://github.com/RochSchanen/rochpygui
+
+# The AsyncInstrument class gives awaitable queries and writes on top of
+# an instrument worker (see visa.py). The Session class runs an asyncio
+# event loop in a background thread, next to the wx MainLoop: coroutines
+# are started from the GUI with Run() and their result is returned to the
+# GUI thread with wx.CallAfter(). Since each instrument has its own worker
+# thread, the waits on several instruments overlap. Example:
+#
+#   session = Session()
+#   LCKN, GNTR = AsyncInstrument(lockin), AsyncInstrument(generator)
+#
+#   async def Read():
+#       return await asyncio.gather(
+#           LCKN.query('SNAP?1,2'),
+#           GNTR.query_many(['FREQ?', 'VOLT?']))
+#
+#   session.Run(Read(), lambda future: print(future.result()))
+
+# python: https://www.python.org/
+import asyncio
+from threading import Thread
+
+# wxpython: https://www.wxpython.org/
+import wx
+
+###############################################################################
+################################## INSTRUMENT #################################
+###############################################################################
+
+# awaitable access to an InstrumentWorker. Timeouts are in seconds (None
+# waits for ever). On timeout, asyncio.TimeoutError is raised and a command
+# that has not been started by the worker yet is cancelled.
+class AsyncInstrument():
+
+    def __init__(self, Worker):
+        # PARAMETERS
+        self.worker = Worker
+        # done
+        return
+
+    async def _wait(self, future, Timeout):
+        return await asyncio.wait_for(asyncio.wrap_future(future), Timeout)
+
+    async def write(self, Command, Timeout = None):
+        return await self._wait(self.worker.write(Command), Timeout)
+
+    async def query(self, Command, Timeout = None):
+        return await self._wait(self.worker.query_async(Command), Timeout)
+
+    # several queries in a single worker job (returns the list of replies)
+    async def query_many(self, Commands, Timeout = None):
+        future = self.worker.Submit(_queries, list(Commands))
+        return await self._wait(future, Timeout)
+
+# runs in the worker thread
+def _queries(Resource, Commands):
+    return [Resource.query(C) for C in Commands]
+
+###############################################################################
+################################### SESSION ###################################
+###############################################################################
+
+# an asyncio event loop running in a background thread
+class Session():
+
+    def __init__(self):
+        # LOCAL
+        self.loop   = asyncio.new_event_loop()
+        self.thread = Thread(target = self._run, daemon = True)
+        # start loop
+        self.thread.start()
+        # done
+        return
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+        return
+
+    # schedule the Coroutine in the session loop (can be called from
+    # any thread). Done(future) is called in the GUI thread when the
+    # coroutine completes. Returns a concurrent.futures.Future: use
+    # its cancel() method to cancel the coroutine.
+    def Run(self, Coroutine, Done = None):
+        future = asyncio.run_coroutine_threadsafe(Coroutine, self.loop)
+        if Done:
+            future.add_done_callback(
+                lambda future: wx.CallAfter(Done, future))
+        return future
+
+    # stop the loop (the pending coroutines are cancelled)
+    def Stop(self):
+        if not self.loop.is_running(): return
+        asyncio.run_coroutine_threadsafe(self._cancel(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        return
+
+    async def _cancel(self):
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions = True)
+        return
@@ -27,10 +27,10 @@ class myApp(App):
     def Start(self):
         # instantiate generator
         GNTR = generator(self.Panel)
-        GNTR.SetVisa(VISA.open_resource('GPIB0::06::INSTR'))
+        GNTR.SetVisa(Open('GPIB0::06::INSTR'))
         # instantiate lock-in
         LCKN = lock_in(self.Panel)
-        LCKN.SetVisa(VISA.open_resource('GPIB0::14::INSTR'))
+        LCKN.SetVisa(Open('GPIB0::14::INSTR'))
         SETUP = Group(VERTICAL)
         SETUP.Place(GNTR, deco = 'Outset')
         SETUP.Place(LCKN, deco = 'Outset')
@@ -45,21 +45,21 @@ class myApp(App):
         x = Height/(1+s**2);
         y = Height*s/(1+s**2)
         IG = InteractiveGraph(self.Panel)
-        IG.Graph.SetXLabel("Generator frequency / Hz")
-        IG.Graph.SetXLimit(123.151, +123.175)
-        IG.Graph.SetXFormat(3, 3)
-        IG.Graph.SetXTicks(5)
-        IG.Graph.SetYLabel("Lock-in output / V")
-        IG.Graph.SetYLimit(-0.51, +0.9)
-        IG.Graph.SetYFormat(1, 2)
-        IG.Graph.SetYTicks(9)
-        Vx = IG.Graph.AddBufferedPlot()
-        Vx.SetData(t, x)
-        Vx.SetPointStyle(['RED','SMALL'])
-        Vy = IG.Graph.AddPlot()
-        Vy.SetData(t, y)
-        Vy.SetPointStyle(['BLUE','SMALL'])
-        IG.Graph.RefreshBuffer()
+        with IG.Graph.BatchUpdate():
+            IG.Graph.SetXLabel("Generator frequency / Hz")
+            IG.Graph.SetXLimit(123.151, +123.175)
+            IG.Graph.SetXFormat(3, 3)
+            IG.Graph.SetXTicks(5)
+            IG.Graph.SetYLabel("Lock-in output / V")
+            IG.Graph.SetYLimit(-0.51, +0.9)
+            IG.Graph.SetYFormat(1, 2)
+            IG.Graph.SetYTicks(9)
+            Vx = IG.Graph.AddBufferedPlot()
+            Vx.SetData(t, x)
+            Vx.SetPointStyle(['RED','SMALL'])
+            Vy = IG.Graph.AddPlot()
+            Vy.SetData(t, y)
+            Vy.SetPointStyle(['BLUE','SMALL'])
         # set-up Main
         Main = Group(HORIZONTAL)
         Main.Place(IG,    deco = 'Outset')
@@ -15,3 +15,362 @@ _gpibSetup() # set gpib_ctypes as pyvisa-py backend for GPIB communication
 from pyvisa import ResourceManager as visaSetup
 VISA = visaSetup('@py') # set pyvisa-py as backend for VISA communication
 
+
+# wxpython: https://www.wxpython.org/
+import wx
+
+# python: https://www.python.org/
+from threading import Thread, Timer, RLock
+from queue import SimpleQueue
+from time import monotonic
+from concurrent.futures import Future
+
+###############################################################################
+#################################### WORKER ###################################
+###############################################################################
+
+# A worker thread owning one instrument resource. All the bus traffic with
+# the instrument goes through the worker queue: the commands are executed
+# in the order they are submitted and the GUI thread is never blocked by
+# a slow query (except when the blocking query() is used). The results
+# are returned as futures (concurrent.futures.Future). Use wx.CallAfter()
+# in a done callback to get the results back to the GUI thread (see
+# _callAfter()): the blocking query() is meant for scripts only.
+class InstrumentWorker():
+
+    def __init__(self, Resource):
+        # PARAMETERS
+        self.resource = Resource
+        # LOCAL
+        self.queue  = SimpleQueue()
+        self.thread = Thread(target = self._run, daemon = True)
+        # start worker
+        self.thread.start()
+        # done
+        return
+
+    # the worker loop (runs in the worker thread)
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            # stop request
+            if job is None: break
+            future, Function, args = job
+            # the job was cancelled before it started
+            if not future.set_running_or_notify_cancel(): continue
+            try:
+                future.set_result(Function(self.resource, *args))
+            except Exception as error:
+                future.set_exception(error)
+        return
+
+    # run Function(resource, *args) in the worker thread.
+    # Use it to batch several queries in a single job.
+    def Submit(self, Function, *args):
+        future = Future()
+        self.queue.put((future, Function, args))
+        return future
+
+    # non blocking write
+    def write(self, Command):
+        future = self.Submit(lambda R, C: R.write(C), Command)
+        future.add_done_callback(self._writeDone)
+        return future
+
+    # report write errors (nobody waits for the write futures)
+    def _writeDone(self, future):
+        if future.cancelled(): return
+        error = future.exception()
+        if error:
+            print("in 'visa.py',")
+            print(f"write failed: {error}")
+        return
+
+    # non blocking query (returns a future)
+    def query_async(self, Command):
+        return self.Submit(lambda R, C: R.query(C), Command)
+
+    # blocking query (waits for the pending jobs to complete)
+    def query(self, Command, Timeout = None):
+        return self.query_async(Command).result(Timeout)
+
+    # stop the worker thread after the pending jobs
+    # and close the resource (blocking)
+    def Close(self):
+        self.Submit(lambda R: R.close()).result()
+        self.queue.put(None)
+        self.thread.join()
+        return
+
+# open an instrument resource and wrap it in a worker
+def Open(Address):
+    return InstrumentWorker(VISA.open_resource(Address))
+
+# call Function(result) from the GUI thread when the future is done
+def _callAfter(future, Function):
+    def result():
+        if future.cancelled(): return
+        error = future.exception()
+        if error:
+            print("in 'visa.py',")
+            print(f"query failed: {error}")
+            return
+        Function(future.result())
+        return
+    future.add_done_callback(lambda future: wx.CallAfter(result))
+    return
+
+###############################################################################
+#################################### WRITER ###################################
+###############################################################################
+
+# Latest value writer for one instrument setting. Write() only records the
+# command: it is sent when the previous write has completed and at least
+# Interval seconds (minimum interval between two writes) have elapsed.
+# The intermediate values are dropped: a fast wheel spin results in a few
+# writes of the most recent values only. Flush() sends the pending command
+# at once (use it before changing a related setting or reading back).
+class CoalescingWriter():
+
+    def __init__(self, Worker, Interval = 0.05):
+        # PARAMETERS
+        self.worker   = Worker
+        self.interval = Interval
+        # LOCAL
+        self.lock    = RLock()
+        self.pending = None # the latest command not sent yet
+        self.future  = None # the last write sent
+        self.timer   = None
+        self.last    = -Interval # time of the last write
+        # done
+        return
+
+    def SetInterval(self, Interval):
+        self.interval = Interval
+        return
+
+    def Write(self, Command):
+        with self.lock:
+            self.pending = Command
+            self._next()
+        return
+
+    # send the pending command when the instrument is ready
+    def _next(self):
+        with self.lock:
+            if self.pending is None: return
+            # the previous write is not completed yet (see _done)
+            if self.future and not self.future.done(): return
+            # wait for the end of the minimum interval
+            wait = self.last+self.interval-monotonic()
+            if wait > 0:
+                if self.timer is None:
+                    self.timer = Timer(wait, self._onTimer)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            self._send()
+        return
+
+    def _send(self):
+        Command, self.pending = self.pending, None
+        self.last = monotonic()
+        self.future = self.worker.write(Command)
+        self.future.add_done_callback(self._done)
+        return
+
+    def _onTimer(self):
+        with self.lock:
+            self.timer = None
+            self._next()
+        return
+
+    def _done(self, future):
+        self._next()
+        return
+
+    # send the pending command now, without waiting: the commands
+    # submitted to the worker afterwards are executed after it.
+    # Returns the future of the last write (None if none).
+    def Flush(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending is not None: self._send()
+            future = self.future
+        return future
+
+###############################################################################
+#################################### SHADOW ###################################
+###############################################################################
+
+# compare register values as numbers when possible ("5" == "5.00")
+def _normal(Value):
+    Value = Value.strip()
+    try:
+        return float(Value)
+    except ValueError:
+        return Value.upper()
+
+# Shadow register map of an instrument. The commands "KEY value" are
+# sent only when the value differs from the last known value of the
+# register KEY. The last known values are recorded from the writes and
+# from the replies to the queries "KEY?" (without parameters). Use
+# Resync() when the instrument state may have changed outside of this
+# program (front panel, other program, ...): the values are forgotten
+# and recorded again by the next queries. The other commands are passed
+# through unchanged.
+class ShadowRegisters():
+
+    def __init__(self, Instrument):
+        # PARAMETERS
+        self.instr = Instrument
+        # LOCAL
+        self.registers = {}
+        # done
+        return
+
+    # returns the future of the write (already done when the
+    # value is unchanged). The value is recorded once written.
+    def write(self, Command):
+        Key, _, Value = Command.strip().partition(' ')
+        if not Value: return self.instr.write(Command)
+        Value = _normal(Value)
+        # no change
+        if self.registers.get(Key) == Value:
+            future = Future()
+            future.set_result(None)
+            return future
+        future = self.instr.write(Command)
+        future.add_done_callback(
+            lambda future: self._written(Key, Value, future))
+        return future
+
+    def _written(self, Key, Value, future):
+        if future.cancelled(): return
+        if future.exception(): return
+        self.registers[Key] = Value
+        return
+
+    def query(self, Command, *args):
+        Reply = self.instr.query(Command, *args)
+        self.Record(Command, Reply)
+        return Reply
+
+    def query_async(self, Command):
+        future = self.instr.query_async(Command)
+        future.add_done_callback(
+            lambda future: self._done(Command, future))
+        return future
+
+    def _done(self, Command, future):
+        if future.cancelled(): return
+        if future.exception(): return
+        self.Record(Command, future.result())
+        return
+
+    # record the reply to a query (the batched queries
+    # are split, see QueryBatch, which also calls Record())
+    def Record(self, Command, Reply):
+        Commands, Replies = Command.split(';'), Reply.split(';')
+        if len(Commands) != len(Replies): return
+        for C, R in zip(Commands, Replies):
+            C = C.strip().lstrip(':')
+            # record "KEY?" replies only
+            if not C.endswith('?'): continue
+            if ' ' in C: continue
+            self.registers[C[:-1]] = _normal(R)
+        return
+
+    # jobs are passed through (nothing is recorded)
+    def Submit(self, Function, *args):
+        return self.instr.Submit(Function, *args)
+
+    # forget all the register values
+    def Resync(self):
+        self.registers.clear()
+        return
+
+    # the last known value of the register Key (None if unknown)
+    def Get(self, Key):
+        return self.registers.get(Key)
+
+    def Close(self):
+        self.instr.Close()
+        return
+
+###############################################################################
+#################################### BATCH ####################################
+###############################################################################
+
+# Several queries sent as a single command line. The queries are joined
+# by Separator: ';' for the SR830, ';:' for the SCPI instruments (the
+# colon brings the next command back to the root of the command tree).
+# The replies are read until there is one per query (see _batch()) and
+# each reply is passed to the callback of its query, in the order of
+# registration, by the GUI thread. When replies are missing, the queries
+# are sent again one by one.
+class QueryBatch():
+
+    def __init__(self, Instrument, Separator = ';'):
+        # PARAMETERS
+        self.instr     = Instrument
+        self.separator = Separator
+        # LOCAL
+        self.queries = []
+        # done
+        return
+
+    # register the query Command: Callback(Reply) is called by Run()
+    def Add(self, Command, Callback):
+        self.queries.append((Command, Callback))
+        return
+
+    # send the queries in one round trip (worker thread, no waiting)
+    def Run(self):
+        queries, self.queries = self.queries, []
+        if not queries: return
+        Commands = [C for C, F in queries]
+        future = self.instr.Submit(_batch, Commands, self.separator)
+        # GUI thread
+        def done(Replies):
+            # record the replies (see ShadowRegisters)
+            if hasattr(self.instr, 'Record'):
+                for C, R in zip(Commands, Replies): self.instr.Record(C, R)
+            for (C, F), R in zip(queries, Replies): F(R.strip())
+            return
+        _callAfter(future, done)
+        return
+
+# The batched queries (runs in the worker thread). Some instruments join
+# the replies with semicolons on a single line (SCPI), others terminate
+# each reply with its own line: the lines are read and split until there
+# is one reply per query, so that no reply is left unread in any case.
+def _batch(Resource, Commands, Separator):
+    n = len(Commands)
+    Resource.write(Separator.join(Commands))
+    Replies = []
+    try:
+        while len(Replies) < n:
+            Replies += Resource.read().strip().split(';')
+    except Exception as error:
+        # missing replies (the read timed out: nothing is left to read)
+        print("in 'visa.py',")
+        print(f"batch of {n} queries: {len(Replies)} replies ({error}).")
+        return [Resource.query(C) for C in Commands]
+    if len(Replies) != n:
+        print("in 'visa.py',")
+        print(f"batch of {n} queries: {len(Replies)} replies.")
+        return [Resource.query(C) for C in Commands]
+    return Replies
+
+# send Command now, or add it to Batch when a batch is given. In
+# both cases, Callback(Reply) is called later by the GUI thread.
+def Query(Instrument, Command, Callback, Batch = None):
+    if Batch:
+        Batch.Add(Command, Callback)
+    else:
+        future = Instrument.query_async(Command)
+        _callAfter(future, lambda Reply: Callback(Reply.strip()))
+    return